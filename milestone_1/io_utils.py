@@ -15,4 +15,16 @@ def read_markdown(file_path):
 
 def read_csv(file_path):
     df = pd.read_csv(file_path)
-    return df.to_string(index=False)
\ No newline at end of file
+    return df.to_string(index=False)
+
+# Rows pandas parses per read when streaming a CSV; memory stays bounded by
+# this regardless of file size
+CSV_READ_ROWS = 10000
+
+def iter_csv_rows(file_path, chunksize=CSV_READ_ROWS):
+    """Yield (columns, values) for every data row, reading chunksize rows at a time."""
+    reader = pd.read_csv(file_path, chunksize=chunksize, dtype=str, keep_default_na=False)
+    for frame in reader:
+        columns = list(frame.columns)
+        for values in frame.itertuples(index=False, name=None):
+            yield columns, values
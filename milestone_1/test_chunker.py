@@ -0,0 +1,63 @@
+from chunker import iter_csv_chunk_records, rebalance_csv_tail, rows_tokens
+from validation_tests import validate_chunk
+
+HEADER_TOKENS = 10
+
+
+def make_rows(token_counts: list, start: int = 1) -> list:
+    return [(start + i, f"row {start + i}", tokens) for i, tokens in enumerate(token_counts)]
+
+
+def chunk_size(rows: list) -> int:
+    return HEADER_TOKENS + rows_tokens(rows)
+
+
+def test_rebalance_merges_tail_that_fits():
+    previous, last = make_rows([100, 100]), make_rows([50], start=3)
+    assert rebalance_csv_tail(previous, last, HEADER_TOKENS, 300, 512) == ([], previous + last)
+
+
+def test_rebalance_reaches_min_tokens_when_a_split_allows_it():
+    previous, last = make_rows([29] * 10 + [99]), make_rows([150, 45], start=12)
+    first, second = rebalance_csv_tail(previous, last, HEADER_TOKENS, 300, 512)
+
+    assert first + second == previous + last
+    assert 300 <= chunk_size(first) <= 512
+    assert 300 <= chunk_size(second) <= 512
+
+
+def test_rebalance_evens_out_tail_when_no_split_reaches_min_tokens():
+    # The previous chunk cannot give up its last row without dropping below
+    # 300, so moving rows one at a time left a 207-token tail
+    previous, last = make_rows([69, 69, 69, 69, 79]), make_rows([150, 45], start=6)
+    first, second = rebalance_csv_tail(previous, last, HEADER_TOKENS, 300, 512)
+
+    assert first + second == previous + last
+    assert max(chunk_size(first), chunk_size(second)) <= 512
+    assert min(chunk_size(first), chunk_size(second)) > chunk_size(last)
+
+
+def csv_records(tmp_path, lines: list) -> list:
+    path = tmp_path / "data.csv"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return list(iter_csv_chunk_records(str(path), "general", ["employees"]))
+
+
+def test_small_csv_is_one_allowed_short_chunk(tmp_path):
+    records = csv_records(tmp_path, ["name,team", "Asha,Finance", "Ravi,HR"])
+
+    assert len(records) == 1
+    assert records[0]["allow_short"]
+    assert (records[0]["row_start"], records[0]["row_end"]) == (1, 2)
+    assert validate_chunk(records[0]) == ([], [])
+
+
+def test_long_row_pieces_pass_validation(tmp_path):
+    long_field = " ".join(f"word{i}" for i in range(1500))
+    records = csv_records(tmp_path, ["id,notes", "1,short", f"2,{long_field}", "3,short"])
+
+    assert len(records) > 2
+    for record in records:
+        assert validate_chunk(record) == ([], [])
+        assert record["token_count"] <= 512
+        assert record.get("allow_short") == (record["token_count"] < 300)
@@ -1,14 +1,46 @@
+import argparse
+import hashlib
 import json
 import os
-from sentence_transformers import SentenceTransformer
+import time
+import uuid
 import chromadb
+import numpy as np
+
+from embedding_backend import (
+    COMPATIBILITY_MIN_COSINE, EMBEDDING_BACKEND, check_compatibility, load_embedder,
+    read_embedding_meta, write_embedding_meta
+)
+from embedding_store import EMBEDDING_STORE_DIR, EmbeddingStore
+from lexical_index import LEXICAL_INDEX_DIR, build_lexical_index, read_current_build
 
 CHUNKS_PATH = "data/processed/chunks.jsonl"
+# Pre-binary-store cache; imported into EMBEDDING_STORE_DIR on first run
 EMBEDDED_PATH = "data/processed/chunks_with_embeddings.jsonl"
 
 VECTOR_DB_PATH = "data/chroma_db"
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 COLLECTION_NAME = "chroma_db"
+BATCH_SIZE = 64
+
+# Rewritten whenever the collection changes; the backend's answer cache
+# watches it and drops cached answers built on the previous index
+INDEX_VERSION_PATH = "data/chroma_db/index_version"
+
+ALL_ROLES = ["Employees", "Finance", "HR", "Marketing", "Engineering", "C-Level"]
+
+
+def role_flag_key(role: str) -> str:
+    # "C-Level" -> "role_c_level"; search_service builds the same key for its where filter
+    return "role_" + role.strip().lower().replace("-", "_")
+
+
+def build_role_flags(accessible_roles: list) -> dict:
+    allowed = {r.strip().lower() for r in accessible_roles}
+    return {
+        role_flag_key(role): role.lower() in allowed
+        for role in ALL_ROLES
+    }
 
 
 def load_chunks(path: str):
@@ -19,7 +51,52 @@ def load_chunks(path: str):
     return chunks
 
 
-def load_embedding_cache(path: str):
+def resolve_accessible_roles(department: str) -> list:
+    if department.lower() == "general":
+        return list(ALL_ROLES)
+    return [department, "C-Level"]
+
+
+# Only present on chunks cut from CSV rows
+ROW_RANGE_FIELDS = ("row_start", "row_end")
+
+
+def content_hash(chunk: dict) -> str:
+    # Covers everything that ends up in Chroma for a chunk, so an unchanged
+    # hash means neither the vector nor the metadata needs rewriting. That
+    # includes the resolved roles and role_* flags: a change to the RBAC
+    # rules must rewrite the metadata the where filter checks.
+    accessible_roles = sorted(resolve_accessible_roles(chunk["department"]))
+    fields = {
+        "text": chunk["text"],
+        "source_document": chunk["source_document"],
+        "department": chunk["department"],
+        "token_count": chunk["token_count"],
+        "accessible_roles": accessible_roles,
+        "role_flags": build_role_flags(accessible_roles),
+        "model": MODEL_NAME
+    }
+    # Added only when set, so prose chunks keep their existing hashes
+    fields.update({key: chunk[key] for key in ROW_RANGE_FIELDS if key in chunk})
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_metadata(chunk: dict, chunk_hash: str) -> dict:
+    accessible_roles = resolve_accessible_roles(chunk["department"])
+    return {
+        "source_document": chunk["source_document"],
+        "department": chunk["department"],
+        "accessible_roles": ",".join(accessible_roles),
+        "token_count": chunk["token_count"],
+        "content_hash": chunk_hash,
+        **{key: chunk[key] for key in ROW_RANGE_FIELDS if key in chunk},
+        **build_role_flags(accessible_roles)
+    }
+
+
+def load_jsonl_cache(path: str):
+    """Return {content_hash: embedding}. Older chunk_id-keyed records are re-hashed."""
     cache = {}
     if not os.path.exists(path):
         return cache
@@ -27,18 +104,85 @@ def load_embedding_cache(path: str):
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             record = json.loads(line)
-            cache[record["chunk_id"]] = record
+            key = record.get("content_hash") or content_hash(record)
+            cache[key] = record["embedding"]
     return cache
 
 
-def save_embedding_cache(records: list, path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        for record in records:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+def migrate_jsonl_cache(path: str):
+    # One-off import of chunks_with_embeddings.jsonl into the binary store
+    cache = load_jsonl_cache(path)
+    if not cache:
+        return None
+
+    keys = list(cache)
+    store = EmbeddingStore.create(len(cache[keys[0]]), publish=False)
+    store.append(keys, np.asarray([cache[key] for key in keys], dtype=np.float32))
+    store.publish()
+    print(f"Migrated {len(keys)} cached embeddings from {path}; the JSONL file is no longer read")
+    return store
+
+
+def open_embedding_store(full: bool):
+    if full:
+        return None
+    store = EmbeddingStore.open(EMBEDDING_STORE_DIR)
+    if store is None:
+        store = migrate_jsonl_cache(EMBEDDED_PATH)
+    return store
+
+
+def get_indexed_hashes(collection) -> dict:
+    existing = collection.get(include=["metadatas"])
+    return {
+        chunk_id: (meta or {}).get("content_hash")
+        for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+    }
+
+
+def write_index_version(path: str = INDEX_VERSION_PATH):
+    version = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}"
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def iter_batches(items: list, batch_size: int):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def warn_if_incompatible(model, full: bool):
+    # Cached vectors from another backend are reused as-is, so they must be close
+    meta = read_embedding_meta()
+    if full or meta is None or meta.get("backend") == EMBEDDING_BACKEND:
+        return
+    similarity = check_compatibility(model, MODEL_NAME, meta)
+    if similarity < COMPATIBILITY_MIN_COSINE:
+        print(
+            f"Warning: {EMBEDDING_BACKEND} vectors differ from the {meta['backend']} index "
+            f"(cosine {similarity:.4f}); re-run with --full"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed chunks.jsonl into ChromaDB")
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE,
+        help="Chunks encoded and upserted per call"
+    )
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Ignore the cache and the existing collection and rebuild everything"
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     if not os.path.exists(CHUNKS_PATH):
         print(f"Missing file: {CHUNKS_PATH}")
         return
@@ -47,61 +191,96 @@ def main():
 
     print("Loading chunks...")
     chunks = load_chunks(CHUNKS_PATH)
+    hashes = {chunk["chunk_id"]: content_hash(chunk) for chunk in chunks}
 
-    print("Loading embedding cache...")
-    cache = load_embedding_cache(EMBEDDED_PATH)
-
-    print("Loading embedding model...")
-    model = SentenceTransformer(MODEL_NAME)
+    print("Opening embedding store...")
+    store = open_embedding_store(args.full)
 
     print("Initializing ChromaDB (persistent)...")
     client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
 
+    if args.full and COLLECTION_NAME in [c.name for c in client.list_collections()]:
+        client.delete_collection(COLLECTION_NAME)
+
     collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    indexed = get_indexed_hashes(collection)
+
+    # Only chunks that are new or whose content hash moved need any work
+    changed = [c for c in chunks if indexed.get(c["chunk_id"]) != hashes[c["chunk_id"]]]
+    stale_ids = [chunk_id for chunk_id in indexed if chunk_id not in hashes]
+
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    model = None
+    encoded = 0
+    cache_hits = 0
+
+    for batch in iter_batches(changed, args.batch_size):
+        batch_hashes = [hashes[c["chunk_id"]] for c in batch]
+        rows = store.lookup(batch_hashes) if store is not None else np.full(len(batch), -1)
+        cache_hits += int((rows >= 0).sum())
+
+        # Identical chunks share a hash; each is encoded once
+        texts = {h: c["text"] for h, c, row in zip(batch_hashes, batch, rows) if row < 0}
+        if texts:
+            if model is None:
+                print(f"Loading embedding model ({EMBEDDING_BACKEND})...")
+                model = load_embedder(MODEL_NAME)
+                warn_if_incompatible(model, args.full)
+
+            vectors = model.encode(list(texts.values()), batch_size=args.batch_size)
+            if store is None:
+                # A --full rebuild only replaces the old store once it completes
+                store = EmbeddingStore.create(vectors.shape[1], publish=not args.full)
+            store.append(list(texts), vectors)
+            encoded += len(texts)
+            rows = store.lookup(batch_hashes)
+
+        embeddings = np.asarray(store.vectors[rows], dtype=np.float32)
+
+        collection.upsert(
+            ids=[c["chunk_id"] for c in batch],
+            embeddings=embeddings.tolist(),
+            metadatas=[build_metadata(c, h) for c, h in zip(batch, batch_hashes)],
+            documents=[c["text"] for c in batch]
+        )
+
+    if store is not None:
+        if args.full:
+            store.publish()
+        # Vectors of chunks that no longer exist are tombstoned, and the
+        # file rewritten once they make up most of it
+        dropped = store.retain(list(hashes.values()))
+        if store.dead_rows > len(store):
+            store = store.compact()
+        print(f"Embedding store: {len(store)} vectors, {dropped} dropped, {store.dead_rows} dead rows")
+
+    # Probe vectors let search_service check its query-time backend against
+    # the vectors in the index
+    if model is not None or read_embedding_meta() is None:
+        write_embedding_meta(model or load_embedder(MODEL_NAME), MODEL_NAME, EMBEDDING_BACKEND)
 
-    updated_records = []
-
-    for chunk in chunks:
-        chunk_id = chunk["chunk_id"]
-
-        if chunk_id in cache:
-            record = cache[chunk_id]
-            embedding = record["embedding"]
-        else:
-            embedding = model.encode(chunk["text"]).tolist()
-            record = {**chunk, "embedding": embedding}
-
-        updated_records.append(record)
-
-        department = chunk["department"]
-
-        if department.lower() == "general":
-            accessible_roles = [
-                "Employees", "Finance", "HR",
-                "Marketing", "Engineering", "C-Level"
-            ]
-        else:
-            accessible_roles = [department, "C-Level"]
-
-        collection.add(
-            ids=[chunk_id],
-            embeddings=[embedding],
-            metadatas=[{
-                "source_document": chunk["source_document"],
-                "department": department,
-                "accessible_roles": ",".join(accessible_roles),  # FIXED
-                "token_count": chunk["token_count"]
-            }],
-            documents=[chunk["text"]]
+    # The BM25 index always covers exactly the chunks in the collection
+    lexical_missing = read_current_build(LEXICAL_INDEX_DIR) is None
+    if args.full or changed or stale_ids or lexical_missing:
+        build_dir = build_lexical_index(
+            chunks, ALL_ROLES,
+            lambda chunk: resolve_accessible_roles(chunk["department"])
         )
+        print(f"Lexical index: {build_dir}")
 
-    save_embedding_cache(updated_records, EMBEDDED_PATH)
+    if args.full or changed or stale_ids:
+        print(f"Index version: {write_index_version()}")
 
-    print(f"Embedded {len(updated_records)} chunks")
-    print(f"Saved cache to: {EMBEDDED_PATH}")
+    print(f"Chunks total: {len(chunks)}")
+    print(f"Unchanged (skipped): {len(chunks) - len(changed)}")
+    print(f"Upserted: {len(changed)} ({encoded} encoded, {cache_hits} from cache)")
+    print(f"Removed stale: {len(stale_ids)}")
+    print(f"Embedding store at: {EMBEDDING_STORE_DIR}")
     print(f"Chroma collection name: {COLLECTION_NAME}")
     print(f"Vector DB stored at: {VECTOR_DB_PATH}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
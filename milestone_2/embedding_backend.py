@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+# Shared by embedder.py (index time) and milestone_3/search_service.py
+# (query time), selected with EMBEDDING_BACKEND:
+#   torch  SentenceTransformer in fp32 PyTorch (the original path)
+#   int8   the same model with dynamic int8 quantization of every nn.Linear
+#   onnx   ONNX Runtime via optimum, with the same mean pooling + L2
+#          normalization as the SentenceTransformer pipeline
+#          (pip install optimum[onnxruntime]; exported once to ONNX_EXPORT_DIR)
+BACKENDS = ("torch", "int8", "onnx")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+# Intra-op threads for PyTorch / ONNX Runtime; 0 keeps the library default
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", "data/onnx")
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+# Written next to the Chroma index by embedder.py, so query time can check
+# it embeds the same way the index was built
+EMBEDDING_META_PATH = "data/chroma_db/embedding_meta.json"
+
+PROBE_TEXTS = [
+    "What is the leave policy for new employees?",
+    "Quarterly revenue grew while vendor costs increased.",
+    "Describe the backend system architecture and scaling strategy."
+]
+
+# Minimum cosine between index-time and query-time probe vectors
+COMPATIBILITY_MIN_COSINE = float(os.getenv("EMBEDDING_MIN_COSINE", "0.99"))
+
+
+class OnnxEmbedder:
+    """ONNX Runtime encoder with the SentenceTransformer.encode() interface."""
+
+    def __init__(self, model_name: str, threads: int = EMBEDDING_THREADS):
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=onnx needs optimum[onnxruntime] installed"
+            ) from exc
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        export_dir = os.path.join(ONNX_EXPORT_DIR, model_name.replace("/", "--"))
+        if os.path.isdir(export_dir):
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                export_dir, session_options=options
+            )
+        else:
+            print(f"Exporting {model_name} to ONNX (first run only)...")
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                model_name, export=True, session_options=options
+            )
+            self.model.save_pretrained(export_dir)
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np"
+            )
+            hidden = np.asarray(self.model(**inputs).last_hidden_state)
+
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled.astype(np.float32))
+
+        vectors = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+def load_embedder(model_name: str, backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS):
+    """Returns an object with SentenceTransformer's encode(texts, batch_size=...)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {BACKENDS}")
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+    if backend == "onnx":
+        return OnnxEmbedder(model_name, threads)
+
+    model = SentenceTransformer(model_name)
+    model.max_seq_length = MAX_SEQ_LENGTH
+    if backend == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def probe_vectors(embedder) -> list:
+    return [vector.tolist() for vector in np.asarray(embedder.encode(PROBE_TEXTS))]
+
+
+def write_embedding_meta(embedder, model_name: str, backend: str, path: str = EMBEDDING_META_PATH):
+    probes = probe_vectors(embedder)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "backend": backend,
+            "dimension": len(probes[0]),
+            "probes": probes
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def read_embedding_meta(path: str = EMBEDDING_META_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def check_compatibility(embedder, model_name: str, meta: dict) -> float:
+    """
+    Raises if the query-time model cannot be compared with the index at all;
+    otherwise returns the lowest cosine between index-time and query-time
+    probe vectors.
+    """
+    if meta["model"] != model_name:
+        raise RuntimeError(
+            f"Index was built with {meta['model']}, queries use {model_name}; re-run embedder.py"
+        )
+
+    current = np.asarray(probe_vectors(embedder), dtype=np.float32)
+    stored = np.asarray(meta["probes"], dtype=np.float32)
+    if current.shape != stored.shape:
+        raise RuntimeError(
+            f"Embedding dimension {current.shape[1]} does not match the index ({stored.shape[1]})"
+        )
+
+    cosines = (current * stored).sum(axis=1) / (
+        np.linalg.norm(current, axis=1) * np.linalg.norm(stored, axis=1)
+    )
+    return float(cosines.min())
@@ -0,0 +1,258 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+# Binary embedding cache keyed by chunk content hash, replacing the JSON
+# float lists in chunks_with_embeddings.jsonl.
+#
+# Layout under EMBEDDING_STORE_DIR: a CURRENT file naming the active build
+# directory, which holds:
+#
+#   vectors.bin  raw row-major matrix (float32 or float16), append-only;
+#                opened with np.memmap, so reads are zero-copy
+#   index.npy    live entries as (key, row), sorted by key and looked up
+#                with searchsorted; rewritten (os.replace) by flush()
+#   meta.json    dim and dtype
+#
+# Keys are sha256 digests stored as 32 raw bytes. Appends only write
+# vectors.bin; their entries stay in an in-memory delta that lookup()
+# consults, and are merged into index.npy once by flush() (also run by
+# publish(), delete(), retain() and compact()), so a build of N vectors
+# sorts and writes the index once instead of once per batch. A tombstoned
+# key is simply dropped from index.npy; its row stays in vectors.bin as a
+# dead row until compact() writes a new build without them. There is one
+# writer (the embedder); readers never see a row that index.npy does not
+# point to, and rows appended by a run that dies before flushing are dead.
+
+EMBEDDING_STORE_DIR = "data/processed/embeddings"
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+
+INDEX_DTYPE = np.dtype([("key", "S32"), ("row", "<i8")])
+
+
+def read_current_build(store_dir: str = EMBEDDING_STORE_DIR):
+    try:
+        with open(os.path.join(store_dir, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def publish_build(store_dir: str, build: str):
+    current_tmp = os.path.join(store_dir, "CURRENT.tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(build)
+    os.replace(current_tmp, os.path.join(store_dir, "CURRENT"))
+
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if name != build and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def encode_keys(keys) -> np.ndarray:
+    return np.array([bytes.fromhex(key) for key in keys], dtype="S32")
+
+
+def sort_entries(entries: np.ndarray) -> np.ndarray:
+    # Stable sort plus keeping the last occurrence makes newer rows win
+    order = np.argsort(entries["key"], kind="stable")
+    entries = entries[order]
+    last = np.ones(len(entries), dtype=bool)
+    last[:-1] = entries["key"][1:] != entries["key"][:-1]
+    return entries[last]
+
+
+class EmbeddingStore:
+    def __init__(self, build_dir: str):
+        self.build_dir = build_dir
+        with open(os.path.join(build_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        # Appended but not yet in index.npy: raw key -> row
+        self._pending = {}
+        self._reload()
+
+    @classmethod
+    def open(cls, store_dir: str = EMBEDDING_STORE_DIR):
+        build = read_current_build(store_dir)
+        if build is None:
+            return None
+        return cls(os.path.join(store_dir, build))
+
+    @classmethod
+    def create(cls, dim: int, dtype: str = EMBEDDING_STORE_DTYPE, store_dir: str = EMBEDDING_STORE_DIR, publish: bool = True):
+        """
+        Starts an empty build. With publish=False it only becomes CURRENT
+        after publish() is called, so a rebuild can fail without losing the
+        old cache.
+        """
+        build = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        build_dir = os.path.join(store_dir, build)
+        os.makedirs(build_dir)
+
+        with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": int(dim), "dtype": np.dtype(dtype).name}, f)
+        open(os.path.join(build_dir, "vectors.bin"), "wb").close()
+        np.save(os.path.join(build_dir, "index.npy"), np.zeros(0, dtype=INDEX_DTYPE))
+
+        if publish:
+            publish_build(store_dir, build)
+        return cls(build_dir)
+
+    def publish(self):
+        self.flush()
+        store_dir, build = os.path.split(self.build_dir)
+        publish_build(store_dir, build)
+
+    def _reload(self):
+        self.index = np.load(os.path.join(self.build_dir, "index.npy"), mmap_mode="r")
+        self._map_vectors()
+
+    def _map_vectors(self):
+        # A row only counts once it is complete; a torn append leaves a tail
+        # that the next append overwrites
+        path = os.path.join(self.build_dir, "vectors.bin")
+        row_bytes = self.dim * self.dtype.itemsize
+        self.rows = os.path.getsize(path) // row_bytes
+        if self.rows:
+            self.vectors = np.memmap(path, dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=self.dtype)
+
+    def __len__(self):
+        if not self._pending:
+            return len(self.index)
+        added = np.array(list(self._pending), dtype="S32")
+        return len(self.index) + int((self._index_rows(added) < 0).sum())
+
+    @property
+    def dead_rows(self) -> int:
+        return self.rows - len(self)
+
+    def _index_rows(self, wanted: np.ndarray) -> np.ndarray:
+        if not len(wanted) or not len(self.index):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        positions = np.searchsorted(self.index["key"], wanted)
+        positions = np.minimum(positions, len(self.index) - 1)
+        found = self.index["key"][positions] == wanted
+        return np.where(found, self.index["row"][positions], -1)
+
+    def lookup(self, keys) -> np.ndarray:
+        """Row of each hex key, or -1 when it is not in the store."""
+        if not len(keys):
+            return np.full(0, -1, dtype=np.int64)
+
+        wanted = encode_keys(keys)
+        rows = self._index_rows(wanted)
+        if self._pending:
+            # Unflushed appends are newer than anything in index.npy
+            for i, key in enumerate(wanted):
+                row = self._pending.get(key)
+                if row is not None:
+                    rows[i] = row
+        return rows
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.lookup([key])[0] >= 0)
+
+    def get(self, key: str):
+        row = self.lookup([key])[0]
+        return None if row < 0 else self.vectors[row]
+
+    def append(self, keys: list, vectors) -> None:
+        """
+        Writes the vectors after the last complete row. Their keys are
+        visible to lookup() at once and reach index.npy on the next flush();
+        a key already present points at its new row afterwards.
+        """
+        if not len(keys):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.shape != (len(keys), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(keys)}, {self.dim}), got {vectors.shape}")
+
+        with open(os.path.join(self.build_dir, "vectors.bin"), "r+b") as f:
+            f.seek(self.rows * self.dim * self.dtype.itemsize)
+            f.write(vectors.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+        first_row = self.rows
+        self._map_vectors()
+        for row, key in enumerate(encode_keys(keys), start=first_row):
+            self._pending[key] = row
+
+    def _entries(self) -> np.ndarray:
+        # index.npy with the unflushed appends merged in, sorted by key
+        if not self._pending:
+            return np.asarray(self.index)
+        added = np.zeros(len(self._pending), dtype=INDEX_DTYPE)
+        added["key"] = list(self._pending)
+        added["row"] = list(self._pending.values())
+        return sort_entries(np.concatenate([np.asarray(self.index), added]))
+
+    def flush(self) -> None:
+        """Merges appended entries into index.npy; a no-op when there are none."""
+        if self._pending:
+            self._write_index(self._entries())
+
+    def delete(self, keys) -> int:
+        """Tombstones keys; returns how many were present."""
+        entries = self._entries()
+        if not len(keys) or not len(entries):
+            self.flush()
+            return 0
+        removed = np.isin(entries["key"], encode_keys(keys))
+        if removed.any() or self._pending:
+            self._write_index(entries[~removed])
+        return int(removed.sum())
+
+    def retain(self, keys) -> int:
+        """Tombstones every key not in keys; returns how many were dropped."""
+        entries = self._entries()
+        if not len(entries):
+            return 0
+        kept = np.isin(entries["key"], encode_keys(keys))
+        if not kept.all() or self._pending:
+            self._write_index(entries[kept])
+        return int((~kept).sum())
+
+    def _write_index(self, entries: np.ndarray):
+        entries = sort_entries(entries)
+
+        tmp_path = os.path.join(self.build_dir, "index.tmp.npy")
+        np.save(tmp_path, entries)
+        os.replace(tmp_path, os.path.join(self.build_dir, "index.npy"))
+        self._pending = {}
+        self._reload()
+
+    def compact(self):
+        """
+        Copies live rows into a new build, in key order, and makes it
+        CURRENT. Returns the new store.
+        """
+        self.flush()
+        store_dir = os.path.dirname(self.build_dir)
+        compacted = EmbeddingStore.create(self.dim, self.dtype.name, store_dir, publish=False)
+
+        with open(os.path.join(compacted.build_dir, "vectors.bin"), "wb") as f:
+            # In slices, so a large store is never copied into memory at once
+            for start in range(0, len(self.index), 65536):
+                rows = self.index["row"][start:start + 65536]
+                f.write(np.ascontiguousarray(self.vectors[rows]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        entries = np.zeros(len(self.index), dtype=INDEX_DTYPE)
+        entries["key"] = self.index["key"]
+        entries["row"] = np.arange(len(self.index))
+        compacted._write_index(entries)
+        compacted.publish()
+        return compacted
@@ -0,0 +1,223 @@
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+
+# BM25 inverted index over the same chunks that go into Chroma.
+#
+# Layout under LEXICAL_INDEX_DIR: a CURRENT file naming the active build
+# directory, which holds plain .npy arrays (opened with mmap_mode="r", so
+# workers share the pages) plus meta.json:
+#
+#   terms.npy        sorted vocabulary (fixed-width unicode), looked up with searchsorted
+#   idf.npy          BM25 idf per term
+#   offsets.npy      postings for term t are [offsets[t], offsets[t + 1])
+#   doc_ids.npy      postings: chunk rows, ascending within a term
+#   tfs.npy          postings: term frequency
+#   doc_lengths.npy  tokens per chunk
+#   role_masks.npy   bit r set when ROLES[r] may read the chunk
+#   meta.json        chunk ids (row order), roles, k1, b, avgdl
+
+LEXICAL_INDEX_DIR = "data/lexical_index"
+
+K1 = 1.2
+B = 0.75
+MAX_TERM_LENGTH = 32
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'&@-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how i in is it its me my of on or
+our the their this to was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS or len(token) > MAX_TERM_LENGTH:
+            continue
+        tokens.append(token)
+        # "q4-2024" or "aadhya.patel" also match on their parts
+        if not token.isalnum():
+            tokens.extend(
+                part for part in re.split(r"[.'&@-]", token)
+                if part and part not in STOPWORDS
+            )
+    return tokens
+
+
+def role_mask(accessible_roles: list, roles: list) -> int:
+    allowed = {r.strip().lower() for r in accessible_roles}
+    mask = 0
+    for bit, role in enumerate(roles):
+        if role.lower() in allowed:
+            mask |= 1 << bit
+    return mask
+
+
+def build_lexical_index(chunks, roles: list, resolve_roles, index_dir: str = LEXICAL_INDEX_DIR) -> str:
+    """
+    chunks: records from chunks.jsonl, in any iterable; they are read once
+    and only their term counts are kept. resolve_roles(chunk) returns the
+    roles allowed to read a chunk, the same ones written to Chroma.
+    Returns the new build directory.
+    """
+    if len(roles) > 32:
+        raise ValueError("role_masks are uint32; at most 32 roles are supported")
+
+    chunk_ids = []
+    chunk_masks = []
+    term_frequencies = []
+    document_frequency = Counter()
+    for chunk in chunks:
+        tf = Counter(tokenize(chunk["text"]))
+        term_frequencies.append(tf)
+        document_frequency.update(tf.keys())
+        chunk_ids.append(chunk["chunk_id"])
+        chunk_masks.append(role_mask(resolve_roles(chunk), roles))
+
+    terms = sorted(document_frequency)
+    term_ids = {term: i for i, term in enumerate(terms)}
+
+    postings = [[] for _ in terms]
+    for row, tf in enumerate(term_frequencies):
+        for term, count in tf.items():
+            postings[term_ids[term]].append((row, count))
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    doc_ids = np.fromiter((row for p in postings for row, _ in p), dtype=np.int32, count=int(offsets[-1]))
+    tfs = np.fromiter((count for p in postings for _, count in p), dtype=np.float32, count=int(offsets[-1]))
+
+    n_docs = len(chunk_ids)
+    df = np.array([document_frequency[t] for t in terms], dtype=np.float32)
+    idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    doc_lengths = np.array([sum(tf.values()) for tf in term_frequencies], dtype=np.float32)
+    role_masks = np.array(chunk_masks, dtype=np.uint32)
+
+    build = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    build_dir = os.path.join(index_dir, build)
+    os.makedirs(build_dir)
+
+    arrays = {
+        "terms": np.array(terms, dtype=f"<U{MAX_TERM_LENGTH}"),
+        "idf": idf,
+        "offsets": offsets,
+        "doc_ids": doc_ids,
+        "tfs": tfs,
+        "doc_lengths": doc_lengths,
+        "role_masks": role_masks
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(build_dir, f"{name}.npy"), array)
+
+    with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "chunk_ids": chunk_ids,
+            "roles": list(roles),
+            "k1": K1,
+            "b": B,
+            "avgdl": float(doc_lengths.mean()) if n_docs else 0.0
+        }, f)
+
+    # Readers switch over when CURRENT changes; a reader still holding the
+    # previous build keeps its mmaps valid after the directory is removed
+    current_tmp = os.path.join(index_dir, "CURRENT.tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(build)
+    os.replace(current_tmp, os.path.join(index_dir, "CURRENT"))
+
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name != build and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    return build_dir
+
+
+def read_current_build(index_dir: str = LEXICAL_INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class LexicalIndex:
+    def __init__(self, build_dir: str):
+        self.build_dir = build_dir
+
+        def load(name):
+            return np.load(os.path.join(build_dir, f"{name}.npy"), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.idf = load("idf")
+        self.offsets = load("offsets")
+        self.doc_ids = load("doc_ids")
+        self.tfs = load("tfs")
+        self.doc_lengths = load("doc_lengths")
+        self.role_masks = load("role_masks")
+
+        with open(os.path.join(build_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.chunk_ids = meta["chunk_ids"]
+        self.roles = [r.lower() for r in meta["roles"]]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.avgdl = meta["avgdl"] or 1.0
+
+        # Per-document part of the BM25 denominator, computed once
+        self._length_norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lengths) / self.avgdl)
+
+    @classmethod
+    def open(cls, index_dir: str = LEXICAL_INDEX_DIR):
+        build = read_current_build(index_dir)
+        if build is None:
+            return None
+        return cls(os.path.join(index_dir, build))
+
+    def term_id(self, term: str):
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def allowed_rows(self, user_role: str):
+        role = user_role.strip().lower()
+        if role not in self.roles:
+            return np.zeros(len(self.chunk_ids), dtype=bool)
+        bit = np.uint32(1 << self.roles.index(role))
+        return (np.asarray(self.role_masks) & bit) != 0
+
+    def search(self, query: str, user_role: str, k: int = 5) -> list:
+        """
+        Returns [(chunk_id, score), ...], best first, containing only
+        chunks user_role may read. RBAC is applied before ranking.
+        """
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            t = self.term_id(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            rows = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            # Rows are unique within a term's postings, so plain fancy-index += is safe
+            scores[rows] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._length_norm[rows])
+
+        scores[~self.allowed_rows(user_role)] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [(self.chunk_ids[row], float(scores[row])) for row in candidates]
@@ -0,0 +1,437 @@
+"""
+Single-process ingestion: raw documents to Chroma, the embedding store and
+the lexical index in one run, instead of chunker.py -> chunks.jsonl ->
+embedder.py -> validation_tests.py.
+
+    python milestone_2/pipeline.py [--batch-size 64] [--queue-size 8] [--full]
+
+Stages run in their own threads and hand items over through bounded
+queues:
+
+    read -> clean -> chunk -> validate -> embed
+
+A full queue blocks the stage feeding it, so a slow embedder throttles
+chunking instead of letting chunks pile up, and at most queue_size items
+wait between any two stages. Embedding of early documents overlaps with
+reading and chunking of later ones; tokenizers and torch release the GIL
+for the heavy parts.
+
+chunks.jsonl is still written (the catalog, validation_tests.py and
+embedder.py read it), streamed out by the pipeline's sink. Chroma upserts,
+stale deletes and the store, lexical index and index version are only
+published after the whole run has passed validation: a chunk failing a
+field or RBAC check exits 1 with the previous index untouched. A chunk
+outside the 300-512 token range is only warned about and still indexed.
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+import chromadb
+import numpy as np
+
+# chunker, cleaner and validation_tests live in milestone_1 and import their
+# siblings by name, the same way this directory's scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "milestone_1"))
+
+from chunker import RAW_DATA_DIR, ROLE_CONFIG_PATH, build_chunk_records, iter_csv_chunk_records, read_document
+from cleaner import clean_text
+from io_utils import list_documents
+from metadata import get_allowed_roles, infer_department, load_role_mapping
+from validation_tests import validate_chunk
+
+from embedder import (
+    ALL_ROLES, BATCH_SIZE, CHUNKS_PATH, COLLECTION_NAME, MODEL_NAME, VECTOR_DB_PATH,
+    build_metadata, content_hash, get_indexed_hashes, open_embedding_store,
+    resolve_accessible_roles, warn_if_incompatible, write_index_version
+)
+from embedding_backend import EMBEDDING_BACKEND, load_embedder, read_embedding_meta, write_embedding_meta
+from embedding_store import EmbeddingStore
+from lexical_index import LEXICAL_INDEX_DIR, build_lexical_index, read_current_build
+
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0     # blocked on the previous stage
+
+
+class Pipeline:
+    """
+    Runs stage functions in threads. Each stage is fn(items) -> iterable:
+    it pulls from the previous stage's output and yields its own, so a
+    stage can map, filter, or batch. The last stage's output is returned
+    by run() as an iterator in the caller's thread.
+    """
+
+    def __init__(self, stages: list, queue_size: int = QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = [StageStats(name) for name, _ in stages]
+        self.errors = []
+        self._cancel = threading.Event()
+
+    def _put(self, q, item):
+        # Blocking put that still notices a failure elsewhere in the pipeline
+        while not self._cancel.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineCancelled()
+
+    def _drain(self, q, stats: StageStats):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                stats.wait_seconds += time.perf_counter() - start
+                if self._cancel.is_set():
+                    raise PipelineCancelled()
+                continue
+            stats.wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                return
+            stats.items_in += 1
+            yield item
+
+    def _count(self, source, stats: StageStats):
+        for item in source:
+            stats.items_in += 1
+            yield item
+
+    def _run_stage(self, fn, inbox, outbox, stats: StageStats):
+        try:
+            items = self._drain(inbox, stats) if inbox is not None else self._count(self._source, stats)
+            outputs = iter(fn(items))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(outputs)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy_seconds += time.perf_counter() - start
+                stats.items_out += 1
+                self._put(outbox, item)
+            self._put(outbox, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as exc:
+            self.errors.append((stats.name, exc))
+            self._cancel.set()
+
+    def run(self, source):
+        self._source = source
+        inbox = None
+        threads = []
+        for (name, fn), stats in zip(self.stages, self.stats):
+            outbox = queue.Queue(maxsize=self.queue_size)
+            thread = threading.Thread(
+                target=self._run_stage, args=(fn, inbox, outbox, stats),
+                name=f"pipeline-{name}", daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+            inbox = outbox
+
+        try:
+            yield from self._drain(inbox, StageStats("output"))
+        except PipelineCancelled:
+            pass
+        except GeneratorExit:
+            self._cancel.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            name, exc = self.errors[0]
+            raise RuntimeError(f"Pipeline stage {name} failed: {exc!r}") from exc
+
+    def print_stats(self):
+        # busy: time producing output, excluding waits on the previous stage
+        print(f"\n{'stage':<10}{'in':>8}{'out':>8}{'busy s':>10}{'wait s':>10}")
+        for stats in self.stats:
+            busy = stats.busy_seconds - stats.wait_seconds
+            print(
+                f"{stats.name:<10}{stats.items_in:>8}{stats.items_out:>8}"
+                f"{busy:>10.2f}{stats.wait_seconds:>10.2f}"
+            )
+
+
+def read_stage(documents):
+    for doc in documents:
+        # CSVs are read row by row in the chunk stage instead
+        if doc.endswith(".csv"):
+            yield doc, None
+            continue
+        raw_content = read_document(doc)
+        if raw_content is not None:
+            yield doc, raw_content
+
+
+def clean_stage(documents):
+    for doc, raw_content in documents:
+        yield doc, clean_text(raw_content) if raw_content is not None else None
+
+
+def make_chunk_stage(role_config: dict):
+    def chunk_stage(documents):
+        for doc, cleaned_content in documents:
+            department = infer_department(doc, role_config)
+            allowed_roles = get_allowed_roles(department, role_config)
+            if cleaned_content is None:
+                records = iter_csv_chunk_records(doc, department, allowed_roles)
+            else:
+                records = build_chunk_records(doc, cleaned_content, department, allowed_roles)
+
+            count = 0
+            for count, record in enumerate(records, start=1):
+                yield record
+            print(f"Chunked: {doc} → {count} chunks")
+    return chunk_stage
+
+
+def make_validate_stage(rejected: list, warned: list):
+    # Chunks failing a field or RBAC check never reach the index and fail the
+    # run; size warnings are reported but the chunk is still indexed
+    def validate_stage(chunks):
+        for chunk in chunks:
+            errors, warnings = validate_chunk(chunk)
+            if warnings:
+                warned.append((chunk.get("chunk_id"), warnings))
+            if errors:
+                rejected.append((chunk.get("chunk_id"), errors))
+                continue
+            yield chunk
+    return validate_stage
+
+
+class EmbedStage:
+    """
+    Groups chunks into batches and encodes the ones whose content hash is
+    neither in the collection nor in the embedding store. Yields
+    (chunks, hashes, changed mask) per batch; the vectors of changed chunks
+    are in the store (unflushed) for the upsert after validation.
+    """
+
+    def __init__(self, indexed: dict, store, batch_size: int, full: bool):
+        self.indexed = indexed
+        self.store = store
+        self.batch_size = batch_size
+        self.full = full
+        self.model = None
+        # True when this run started the store; it is published at the end
+        self.created = False
+        self.encoded = 0
+        self.cache_hits = 0
+
+    def __call__(self, chunks):
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) == self.batch_size:
+                yield self.embed_batch(batch)
+                batch = []
+        if batch:
+            yield self.embed_batch(batch)
+
+    def embed_batch(self, batch: list):
+        hashes = [content_hash(c) for c in batch]
+        changed = np.array(
+            [self.full or self.indexed.get(c["chunk_id"]) != h for c, h in zip(batch, hashes)]
+        )
+        if not changed.any():
+            return batch, hashes, changed
+
+        changed_hashes = [h for h, flag in zip(hashes, changed) if flag]
+        rows = self.store.lookup(changed_hashes) if self.store is not None else np.full(len(changed_hashes), -1)
+        self.cache_hits += int((rows >= 0).sum())
+
+        texts = {h: c["text"] for h, c, flag in zip(hashes, batch, changed) if flag}
+        texts = {h: texts[h] for h, row in zip(changed_hashes, rows) if row < 0}
+        if texts:
+            if self.model is None:
+                print(f"Loading embedding model ({EMBEDDING_BACKEND})...")
+                self.model = load_embedder(MODEL_NAME)
+                warn_if_incompatible(self.model, self.full)
+
+            vectors = self.model.encode(list(texts.values()), batch_size=self.batch_size)
+            if self.store is None:
+                self.store = EmbeddingStore.create(vectors.shape[1], publish=False)
+                self.created = True
+            self.store.append(list(texts), vectors)
+            self.encoded += len(texts)
+
+        return batch, hashes, changed
+
+
+def iter_written_chunks(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Chunk, validate, embed and index data/raw in one pass")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Chunks encoded and upserted per call")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Items buffered between two stages")
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Ignore the cache and the existing collection and rebuild everything"
+    )
+    return parser.parse_args()
+
+
+def iter_chunk_batches(path: str, chunk_ids: set, batch_size: int):
+    # Chunks of chunk_ids, read back from the file the sink wrote
+    batch = []
+    for chunk in iter_written_chunks(path):
+        if chunk["chunk_id"] in chunk_ids:
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def ingest(batch_size: int = BATCH_SIZE, queue_size: int = QUEUE_SIZE, full: bool = False):
+    started = time.perf_counter()
+
+    # Sorted so chunk ids and order match chunker.py
+    documents = sorted(list_documents(RAW_DATA_DIR))
+    role_config = load_role_mapping(ROLE_CONFIG_PATH)
+
+    os.makedirs(os.path.dirname(CHUNKS_PATH), exist_ok=True)
+    os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+
+    print("Initializing ChromaDB (persistent)...")
+    client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    # With --full every chunk counts as changed; the old collection is only
+    # dropped once the run has passed validation
+    indexed = {} if full else get_indexed_hashes(collection)
+
+    rejected, warned = [], []
+    embed_stage = EmbedStage(indexed, open_embedding_store(full), batch_size, full)
+    pipeline = Pipeline([
+        ("read", read_stage),
+        ("clean", clean_stage),
+        ("chunk", make_chunk_stage(role_config)),
+        ("validate", make_validate_stage(rejected, warned)),
+        ("embed", embed_stage)
+    ], queue_size=queue_size)
+
+    # The sink only records chunks; nothing reader-visible changes until
+    # every chunk has been validated
+    seen = {}
+    changed_ids = set()
+    tmp_path = CHUNKS_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for batch, hashes, changed in pipeline.run(documents):
+            for chunk, h, flag in zip(batch, hashes, changed):
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                seen[chunk["chunk_id"]] = h
+                if flag:
+                    changed_ids.add(chunk["chunk_id"])
+
+    for chunk_id, warnings in warned:
+        print(f" WARN {chunk_id}: {'; '.join(warnings)}")
+
+    store = embed_stage.store
+    if rejected:
+        # The collection, chunks.jsonl, the lexical index and the index
+        # version are untouched. Vectors appended to the current store are
+        # not in its index (never flushed), and a new build is discarded.
+        os.remove(tmp_path)
+        if embed_stage.created:
+            shutil.rmtree(store.build_dir, ignore_errors=True)
+        pipeline.print_stats()
+        for chunk_id, errors in rejected:
+            print(f" REJECTED {chunk_id}: {'; '.join(errors)}")
+        print(f"\n{len(rejected)} chunks failed validation; nothing was published")
+        sys.exit(1)
+
+    if full and COLLECTION_NAME in [c.name for c in client.list_collections()]:
+        client.delete_collection(COLLECTION_NAME)
+        collection = client.get_or_create_collection(name=COLLECTION_NAME)
+
+    # Vectors come back out of the store's memmap, one batch at a time
+    upserted = 0
+    for batch in iter_chunk_batches(tmp_path, changed_ids, batch_size):
+        hashes = [seen[c["chunk_id"]] for c in batch]
+        vectors = np.asarray(store.vectors[store.lookup(hashes)], dtype=np.float32)
+        collection.upsert(
+            ids=[c["chunk_id"] for c in batch],
+            embeddings=vectors.tolist(),
+            metadatas=[build_metadata(c, h) for c, h in zip(batch, hashes)],
+            documents=[c["text"] for c in batch]
+        )
+        upserted += len(batch)
+
+    # Readers never see a half-written chunks.jsonl
+    os.replace(tmp_path, CHUNKS_PATH)
+
+    stale_ids = [chunk_id for chunk_id in indexed if chunk_id not in seen]
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    if store is not None:
+        if embed_stage.created:
+            store.publish()
+        dropped = store.retain(list(seen.values()))
+        if store.dead_rows > len(store):
+            store = store.compact()
+        print(f"Embedding store: {len(store)} vectors, {dropped} dropped, {store.dead_rows} dead rows")
+
+    if embed_stage.model is not None or read_embedding_meta() is None:
+        write_embedding_meta(embed_stage.model or load_embedder(MODEL_NAME), MODEL_NAME, EMBEDDING_BACKEND)
+
+    # Built from the chunks.jsonl just written, one record at a time
+    lexical_missing = read_current_build(LEXICAL_INDEX_DIR) is None
+    if full or upserted or stale_ids or lexical_missing:
+        build_dir = build_lexical_index(
+            iter_written_chunks(CHUNKS_PATH), ALL_ROLES,
+            lambda chunk: resolve_accessible_roles(chunk["department"])
+        )
+        print(f"Lexical index: {build_dir}")
+
+    if full or upserted or stale_ids:
+        print(f"Index version: {write_index_version()}")
+
+    pipeline.print_stats()
+
+    print(f"\nChunks total: {len(seen)} ({len(warned)} with size warnings)")
+    print(f"Upserted: {upserted} ({embed_stage.encoded} encoded, {embed_stage.cache_hits} from cache)")
+    print(f"Removed stale: {len(stale_ids)}")
+    print(f"Finished in {time.perf_counter() - started:.1f} s")
+
+
+def main():
+    args = parse_args()
+    ingest(args.batch_size, args.queue_size, args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+
+from embedding_backend import EMBEDDING_BACKEND, load_embedder
 
 
 
@@ -10,8 +11,8 @@ MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 
 def main():
-    print("Loading embedding model...")
-    model = SentenceTransformer(MODEL_NAME)
+    print(f"Loading embedding model ({EMBEDDING_BACKEND})...")
+    model = load_embedder(MODEL_NAME)
 
     print("Connecting to ChromaDB...")
     client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
@@ -30,34 +31,25 @@ def main():
     print("\nEmbedding query...")
     query_embedding = model.encode(query).tolist()
 
-    print("Searching vector DB...")
+    print("Searching vector DB (RBAC filter applied in query)...")
+
+    # C-Level sees everything; other roles are filtered on their per-role flag
+    where = None
+    if user_role_norm != "c-level":
+        where = {"role_" + user_role_norm.replace("-", "_"): True}
+
     results = collection.query(
         query_embeddings=[query_embedding],
         n_results=10,
+        where=where,
         include=["documents", "metadatas", "distances"]
     )
 
-    print("\nApplying RBAC filtering...")
-
-    allowed_results = []
-
-    for doc, meta, dist in zip(
+    allowed_results = list(zip(
         results["documents"][0],
         results["metadatas"][0],
         results["distances"][0]
-    ):
-        roles_allowed = [r.strip().lower() for r in meta["accessible_roles"].split(",")]
-
-        # C-Level override
-        if user_role_norm == "c-level":
-            allowed_results.append((doc, meta, dist))
-            continue
-        roles_allowed = [r.strip().lower() for r in meta["accessible_roles"].split(",")]
-        user_role_norm = user_role.strip().lower()
-
-
-        if user_role_norm in roles_allowed:
-            allowed_results.append((doc, meta, dist))
+    ))
 
     if not allowed_results:
         print("\nNo accessible results found for your role.")
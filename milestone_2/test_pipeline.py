@@ -0,0 +1,103 @@
+import os
+
+import chromadb
+import numpy as np
+import pytest
+
+import pipeline
+from embedder import CHUNKS_PATH, COLLECTION_NAME, INDEX_VERSION_PATH, VECTOR_DB_PATH
+from embedding_store import EMBEDDING_STORE_DIR, read_current_build
+
+ROLE_MAPPING = """roles:
+  Finance:
+    folders: ["data/raw/finance"]
+    allowed_roles: ["Finance", "C-Level"]
+
+  General:
+    folders: ["data/raw/general"]
+    allowed_roles: ["Employees", "Finance", "HR", "Marketing", "Engineering", "C-Level"]
+"""
+
+
+class HashingEncoder:
+    # Deterministic stand-in for the sentence-transformer, so the test does
+    # not download a model
+    def encode(self, texts, batch_size=None):
+        return np.array([
+            np.random.default_rng(abs(hash(text)) % 2 ** 32).random(8)
+            for text in texts
+        ], dtype=np.float32)
+
+
+def write_document(path: str, topic: str, sentences: int = 80):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(" ".join(f"The {topic} policy rule number {i} applies to every team." for i in range(sentences)))
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("config")
+    with open("config/role_mapping.yaml", "w", encoding="utf-8") as f:
+        f.write(ROLE_MAPPING)
+    write_document("data/raw/general/handbook.md", "leave")
+    write_document("data/raw/finance/budget.md", "expense")
+
+    monkeypatch.setattr(pipeline, "load_embedder", lambda model_name: HashingEncoder())
+    monkeypatch.setattr(pipeline, "warn_if_incompatible", lambda model, full: None)
+    monkeypatch.setattr(pipeline, "write_embedding_meta", lambda *args: None)
+    return tmp_path
+
+
+def reject_finance(monkeypatch):
+    validate_chunk = pipeline.validate_chunk
+
+    def validate(chunk):
+        errors, warnings = validate_chunk(chunk)
+        if chunk["department"] == "Finance":
+            errors = errors + [f"Rejected {chunk['chunk_id']} for the test"]
+        return errors, warnings
+
+    monkeypatch.setattr(pipeline, "validate_chunk", validate)
+
+
+def read_bytes(path: str):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def snapshot():
+    collection = chromadb.PersistentClient(path=VECTOR_DB_PATH).get_collection(COLLECTION_NAME)
+    contents = collection.get(include=["metadatas", "documents", "embeddings"])
+    build = read_current_build(EMBEDDING_STORE_DIR)
+    return {
+        "ids": contents["ids"],
+        "metadatas": contents["metadatas"],
+        "documents": contents["documents"],
+        "embeddings": np.asarray(contents["embeddings"]).tolist(),
+        "store_build": build,
+        "store_index": read_bytes(os.path.join(EMBEDDING_STORE_DIR, build, "index.npy")),
+        "store_builds": sorted(os.listdir(EMBEDDING_STORE_DIR)),
+        "chunks": read_bytes(CHUNKS_PATH),
+        "index_version": read_bytes(INDEX_VERSION_PATH)
+    }
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_rejected_run_leaves_previous_index_unchanged(workspace, monkeypatch, full):
+    pipeline.ingest(batch_size=4)
+    before = snapshot()
+    assert any(department == "Finance" for department in (m["department"] for m in before["metadatas"]))
+
+    # Changed text means the next run would upsert and re-embed
+    write_document("data/raw/general/handbook.md", "holiday")
+    write_document("data/raw/finance/budget.md", "travel")
+    reject_finance(monkeypatch)
+
+    with pytest.raises(SystemExit) as exit_info:
+        pipeline.ingest(batch_size=4, full=full)
+
+    assert exit_info.value.code == 1
+    assert snapshot() == before
+    assert not os.path.exists(CHUNKS_PATH + ".tmp")
@@ -1,20 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import os
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from milestone_3.auth import get_current_user
-from milestone_3.rag import rag_pipeline
+from milestone_3.rag import rag_pipeline_async, rag_pipeline_batch_async, retrieve_context
+from milestone_3.llm import stream_answer_async
+from milestone_3.prompt_builder import PromptTooLong
+from milestone_3.executors import embed_executor, run_in
+from milestone_3.search_service import embed_query
+from milestone_3.answer_cache import answer_cache
 from milestone_3.rbac import RBAC_RULES
 from milestone_3.logs import log_access
+from milestone_3.tracing import collect_counts, collect_stages, server_timing_header
 
 router = APIRouter()
 
+# Upper bound on queries per /chat/batch request
+CHAT_BATCH_MAX_QUERIES = int(os.getenv("CHAT_BATCH_MAX_QUERIES", "256"))
+
 
 class ChatRequest(BaseModel):
     query: str
 
 
+class ChatBatchRequest(BaseModel):
+    queries: list[str]
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.post("/chat")
-def chat(
+async def chat(
     request: ChatRequest,
+    response: Response,
     current_user: dict = Depends(get_current_user)
 ):
     role = current_user["role"].lower()
@@ -24,15 +47,28 @@ def chat(
     if role not in RBAC_RULES:
         raise HTTPException(status_code=403, detail="Role not allowed")
 
-    # Call RAG
-    result = rag_pipeline(request.query, role)
+    start = time.perf_counter()
+
+    # Call RAG; per-stage timings go back in the Server-Timing header
+    with collect_stages() as stages, collect_counts() as counts:
+        try:
+            result = await rag_pipeline_async(request.query, role)
+        except PromptTooLong as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
+
+    response.headers["Server-Timing"] = server_timing_header(stages)
 
     # STEP 7: Proper AI logging
     log_access(
         username=username,
         role=role,
         query=request.query,
-        confidence=result["confidence"]
+        confidence=result["confidence"],
+        endpoint="/chat",
+        latency_ms=round(1000 * (time.perf_counter() - start), 2),
+        sources=result["sources"],
+        stages_ms={name: round(1000 * seconds, 2) for name, seconds in stages.items()},
+        **counts
     )
 
     return {
@@ -42,3 +78,197 @@ def chat(
         "role": role,
         "department": role
     }
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Server-Sent Events version of /chat.
+    Emits one `sources` event, then `token` events as the answer is
+    generated, then a final `done` event carrying the full answer, or an
+    `error` event if generation fails part way.
+    """
+    role = current_user["role"].lower()
+    username = current_user["username"]
+
+    if role not in RBAC_RULES:
+        raise HTTPException(status_code=403, detail="Role not allowed")
+
+    start = time.perf_counter()
+
+    # Retrieval runs before the response starts so RBAC/search errors
+    # still surface as normal HTTP errors
+    query_embedding = await run_in(embed_executor, embed_query, request.query)
+    cached = answer_cache.get(role, request.query, query_embedding)
+    context = None
+    if not cached:
+        try:
+            context = await run_in(embed_executor, retrieve_context, request.query, role, query_embedding)
+        except PromptTooLong as exc:
+            raise HTTPException(status_code=413, detail=str(exc))
+
+    async def events():
+        if cached:
+            sources, confidence = cached["sources"], cached["confidence"]
+        elif context is None:
+            sources, confidence = [], 0.0
+        else:
+            sources, confidence = context["sources"], context["confidence"]
+
+        yield sse_event("sources", {
+            "sources": sources,
+            "confidence": confidence,
+            "role": role,
+            "department": role
+        })
+
+        counts = {}
+        error = None
+        disconnected = False
+        if cached or context is None:
+            answer = cached["answer"] if cached else "I don't know"
+            yield sse_event("token", {"text": answer})
+        else:
+            parts = []
+            with collect_counts() as counts:
+                tokens = stream_answer_async(context["prompt"])
+                try:
+                    async for text in tokens:
+                        if await http_request.is_disconnected():
+                            disconnected = True
+                            break
+                        parts.append(text)
+                        yield sse_event("token", {"text": text})
+                except Exception as exc:
+                    error = repr(exc)
+                finally:
+                    # Stops generate() at its next token if we left early
+                    await tokens.aclose()
+
+            answer = "".join(parts).strip() or "I don't know"
+
+        if error or disconnected:
+            # Partial answers are neither cached nor reported as done
+            if error:
+                yield sse_event("error", {"detail": "Failed to generate an answer"})
+            log_access(
+                username=username,
+                role=role,
+                query=request.query,
+                confidence=confidence,
+                endpoint="/chat/stream",
+                latency_ms=round(1000 * (time.perf_counter() - start), 2),
+                sources=sources,
+                cached=False,
+                error=error or "Client disconnected",
+                **counts
+            )
+            return
+
+        if not cached:
+            answer_cache.put(role, request.query, query_embedding, {
+                "answer": answer,
+                "sources": sources,
+                "confidence": confidence
+            })
+
+        yield sse_event("done", {"answer": answer})
+
+        log_access(
+            username=username,
+            role=role,
+            query=request.query,
+            confidence=confidence,
+            endpoint="/chat/stream",
+            latency_ms=round(1000 * (time.perf_counter() - start), 2),
+            sources=sources,
+            cached=bool(cached),
+            **counts
+        )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    request: ChatBatchRequest,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Answers many queries in one request: one embed call, one Chroma query
+    and padded generation batches. Results come back in request order; a
+    query that fails gets an "error" instead of an answer and the rest
+    still succeed.
+    """
+    role = current_user["role"].lower()
+    username = current_user["username"]
+
+    if role not in RBAC_RULES:
+        raise HTTPException(status_code=403, detail="Role not allowed")
+
+    if len(request.queries) > CHAT_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {CHAT_BATCH_MAX_QUERIES} queries per batch"
+        )
+
+    start = time.perf_counter()
+
+    items = [{"index": i, "query": query} for i, query in enumerate(request.queries)]
+    valid = [item for item in items if item["query"].strip()]
+    for item in items:
+        if not item["query"].strip():
+            item["error"] = "Empty query"
+
+    with collect_stages() as stages:
+        results = await rag_pipeline_batch_async([item["query"] for item in valid], role) if valid else []
+
+    response.headers["Server-Timing"] = server_timing_header(stages)
+    latency_ms = round(1000 * (time.perf_counter() - start), 2)
+
+    failures = {}
+    for item, result in zip(valid, results):
+        if isinstance(result, PromptTooLong):
+            item["error"] = str(result)
+        elif isinstance(result, Exception):
+            # The exception type goes back to the caller; the full repr only
+            # into that query's access record below
+            item["error"] = f"Failed to answer this query ({type(result).__name__})"
+            failures[item["index"]] = repr(result)
+        else:
+            item.update({
+                "answer": result["answer"],
+                "confidence": result["confidence"],
+                "sources": result["sources"]
+            })
+
+    # One access record per query, so audits read the same as for /chat
+    for item in items:
+        log_access(
+            username=username,
+            role=role,
+            query=item["query"],
+            confidence=item.get("confidence", 0.0),
+            endpoint="/chat/batch",
+            latency_ms=latency_ms,
+            sources=item.get("sources", []),
+            batch_size=len(items),
+            error=item.get("error"),
+            exception=failures.get(item["index"])
+        )
+
+    return {
+        "results": items,
+        "errors": sum(1 for item in items if "error" in item),
+        "role": role,
+        "department": role
+    }
@@ -0,0 +1,177 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from milestone_3.metrics import CallbackMetric
+
+# Rewritten by milestone_2/embedder.py every time the collection changes
+INDEX_VERSION_PATH = "data/chroma_db/index_version"
+
+CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+VERSION_CHECK_SECONDS = 5.0
+
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def role_scope(user_role: str) -> str:
+    # Entries are only ever visible to the role whose RBAC filter produced
+    # them, so a cached answer can never cross an access boundary
+    return user_role.strip().lower()
+
+
+def read_index_version(path: str = INDEX_VERSION_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        similarity_threshold: float = SIMILARITY_THRESHOLD
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (scope, normalized query) -> entry, in LRU order
+        self._index_version = read_index_version()
+        self._version_checked_at = time.monotonic()
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def _check_index_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < VERSION_CHECK_SECONDS:
+            return
+        self._version_checked_at = now
+
+        version = read_index_version()
+        if version != self._index_version:
+            self._entries.clear()
+            self._index_version = version
+
+    def _expired(self, entry: dict) -> bool:
+        return time.monotonic() - entry["created_at"] > self.ttl_seconds
+
+    def get(self, user_role: str, query: str, query_embedding=None):
+        scope = role_scope(user_role)
+        key = (scope, normalize_query(query))
+
+        with self._lock:
+            self._check_index_version()
+
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits_exact += 1
+                return dict(entry["result"])
+
+            if query_embedding is not None:
+                key = self._closest(scope, query_embedding)
+                if key is not None:
+                    self._entries.move_to_end(key)
+                    self.hits_semantic += 1
+                    return dict(self._entries[key]["result"])
+
+            self.misses += 1
+            return None
+
+    def _closest(self, scope: str, query_embedding):
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if key[0] == scope and entry["embedding"] is not None and not self._expired(entry)
+        ]
+        if not candidates:
+            return None
+
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_vec = query_vec / (np.linalg.norm(query_vec) or 1.0)
+
+        matrix = np.stack([entry["embedding"] for _, entry in candidates])
+        scores = matrix @ query_vec
+        best = int(np.argmax(scores))
+
+        if scores[best] < self.similarity_threshold:
+            return None
+        return candidates[best][0]
+
+    def put(self, user_role: str, query: str, query_embedding, result: dict):
+        scope = role_scope(user_role)
+        key = (scope, normalize_query(query))
+
+        embedding = None
+        if query_embedding is not None:
+            embedding = np.asarray(query_embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+
+        with self._lock:
+            self._check_index_version()
+
+            self._entries[key] = {
+                "result": dict(result),
+                "embedding": embedding,
+                "created_at": time.monotonic()
+            }
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_exact + self.hits_semantic) / lookups, 3) if lookups else 0.0,
+                "index_version": self._index_version
+            }
+
+
+answer_cache = AnswerCache()
+
+CallbackMetric(
+    "answer_cache_lookups_total",
+    "Answer cache lookups by outcome",
+    "counter",
+    lambda: {
+        ("exact",): answer_cache.hits_exact,
+        ("semantic",): answer_cache.hits_semantic,
+        ("miss",): answer_cache.misses
+    },
+    labelnames=("result",)
+)
+
+CallbackMetric(
+    "answer_cache_entries",
+    "Answers currently cached",
+    "gauge",
+    lambda: {(): answer_cache.stats()["entries"]}
+)
@@ -1,14 +1,67 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta,timezone
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
+from milestone_3.tracing import stage
 
 SECRET_KEY = "SUPER_SECRET_KEY_CHANGE_ME"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Verified claims are cached per token until the token's own exp, so
+# repeated requests with the same bearer token skip the HMAC check
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "4096"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+
+class TokenCache:
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # sha256(token) -> (claims, exp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        # Raw tokens are bearer credentials; only their digest is kept
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (claims, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -17,25 +70,35 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def verify_access_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # Only successfully verified tokens are cached; bad tokens are
+    # re-checked (and rejected) every time
+    payload = token_cache.get(token)
+    if payload is not None:
         return payload
+
+    try:
+        with stage("auth_verify"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        role = payload.get("role")
+    token_cache.put(token, payload)
+    return payload
 
-        if username is None or role is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+# async so FastAPI runs it on the event loop instead of the threadpool;
+# HS256 verification is cheap enough not to need a thread
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    payload = verify_access_token(token)
+    if payload is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-        return {
-            "username": username,
-            "role": role
-        }
+    username = payload.get("sub")
+    role = payload.get("role")
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+    if username is None or role is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return {
+        "username": username,
+        "role": role
+    }
@@ -0,0 +1,628 @@
+"""
+End-to-end latency benchmark for the RAG path.
+
+    # In-process: replays the workload through rag_pipeline
+    python -m milestone_3.benchmark pipeline --concurrency 4 --repeat 3 --output bench.json
+
+    # Over HTTP: logs in as each role's demo user and POSTs /chat
+    python -m milestone_3.benchmark http --url http://127.0.0.1:8000 --concurrency 8
+
+    # Retrieval only: recall@k and search latency for vector, lexical and hybrid
+    python -m milestone_3.benchmark retrieval --k 5 --repeat 5
+
+    # Generation only: latency per backend and agreement with the fp32 answers
+    python -m milestone_3.benchmark generation --backends torch,int8,onnx
+
+    # Embedding only: latency and texts/s per backend at batch sizes 1-256
+    python -m milestone_3.benchmark embedding --backends torch,int8,onnx --texts chunks
+
+Reports p50/p95/p99 for the whole request and for each stage (embed,
+chroma_query, rbac_filter, prompt_build, generate, ...), plus throughput,
+and writes everything as JSON so runs can be compared.
+"""
+import argparse
+import difflib
+import json
+import platform
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from milestone_3.tracing import collect_stages, parse_server_timing
+
+# Sample queries from milestone_4/app.py, keyed by the role that can answer them
+DEFAULT_WORKLOAD = {
+    "marketing": [
+        "Summarize key highlights of Q4 2024 marketing report",
+        "Describe the Q4 Projections & Targets",
+        "Describe the Q3 Strategic Objectives"
+    ],
+    "finance": [
+        "Summarize the key financial highlights of Q4 2024",
+        "Explain 2024 Annual Summary",
+        "Quarterly Expense Breakdown"
+    ],
+    "engineering": [
+        "Describe the backend system architecture",
+        "Explain company overview",
+        "What is Horizontal Scaling?"
+    ],
+    "hr": [
+        "Give me some full names"
+    ],
+    "employees": [
+        "How do I apply for maternity leave?",
+        "Give me the details of Statutory Benefits",
+        "How is overtime calculated?"
+    ],
+    "c-level": [
+        "Summarize the key financial highlights of Q4 2024",
+        "Describe the backend system architecture"
+    ]
+}
+
+# Labelled queries for the retrieval mode: a chunk is relevant when the
+# role can read it and its text contains expected_text
+DEFAULT_RETRIEVAL_WORKLOAD = [
+    {"role": "marketing", "query": "Describe the Q4 Projections & Targets", "expected_text": "Projections"},
+    {"role": "marketing", "query": "What was the Customer Acquisition Cost?", "expected_text": "Customer Acquisition Cost"},
+    {"role": "finance", "query": "Explain 2024 Annual Summary", "expected_text": "2024 Annual"},
+    {"role": "finance", "query": "Quarterly Expense Breakdown", "expected_text": "Expense Breakdown"},
+    {"role": "engineering", "query": "What is Horizontal Scaling?", "expected_text": "Horizontal Scaling"},
+    {"role": "hr", "query": "What does Shaurya Chopra do?", "expected_text": "Shaurya Chopra"},
+    {"role": "hr", "query": "Which department is Avni Reddy in?", "expected_text": "Avni Reddy"},
+    {"role": "hr", "query": "Who is Saanvi Bhat?", "expected_text": "Saanvi Bhat"},
+    {"role": "employees", "query": "How is overtime calculated?", "expected_text": "overtime"},
+    {"role": "employees", "query": "Give me the details of Statutory Benefits", "expected_text": "Statutory Benefits"},
+    {"role": "c-level", "query": "How do I apply for maternity leave?", "expected_text": "maternity"}
+]
+
+CHUNKS_PATH = "data/processed/chunks.jsonl"
+
+# Demo accounts created by milestone_3/init_db.py
+DEMO_USERS = {
+    "hr": ("hr", "1234"),
+    "finance": ("finance", "1234"),
+    "engineering": ("eng", "1234"),
+    "marketing": ("marketing", "1234"),
+    "employees": ("emp", "1234"),
+    "c-level": ("ceo", "1234")
+}
+
+
+def load_workload(path: str = None) -> list:
+    """
+    Returns [(role, query), ...]. A workload file is either
+    {"role": ["query", ...]} or [{"role": ..., "query": ...}, ...].
+    """
+    data = DEFAULT_WORKLOAD
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        return [(role.lower(), q) for role, queries in data.items() for q in queries]
+    return [(item["role"].lower(), item["query"]) for item in data]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 2),
+        "p95_ms": round(1000 * percentile(values, 95), 2),
+        "p99_ms": round(1000 * percentile(values, 99), 2),
+        "max_ms": round(1000 * max(values), 2) if values else 0.0
+    }
+
+
+def build_report(mode: str, config: dict, samples: list, wall_seconds: float) -> dict:
+    ok = [s for s in samples if s["error"] is None]
+
+    stage_names = sorted({name for s in ok for name in s["stages"]})
+    stages = {
+        name: summarize([s["stages"][name] for s in ok if name in s["stages"]])
+        for name in stage_names
+    }
+
+    per_role = {}
+    for role in sorted({s["role"] for s in ok}):
+        per_role[role] = summarize([s["total"] for s in ok if s["role"] == role])
+
+    errors = [s for s in samples if s["error"] is not None]
+
+    return {
+        "mode": mode,
+        "started_at": config.pop("started_at"),
+        "config": config,
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_samples": [e["error"] for e in errors[:5]],
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 3) if wall_seconds else 0.0,
+        "latency": summarize([s["total"] for s in ok]),
+        "stages": stages,
+        "per_role": per_role
+    }
+
+
+def run_pipeline_request(role: str, query: str) -> dict:
+    from milestone_3.rag import rag_pipeline
+
+    start = time.perf_counter()
+    error = None
+    with collect_stages() as stages:
+        try:
+            rag_pipeline(query, role)
+        except Exception as exc:
+            error = repr(exc)
+
+    return {
+        "role": role,
+        "query": query,
+        "total": time.perf_counter() - start,
+        "stages": dict(stages),
+        "error": error
+    }
+
+
+def make_http_runner(base_url: str, timeout: float):
+    import requests
+
+    tokens = {}
+
+    def login(role: str) -> str:
+        if role not in tokens:
+            username, password = DEMO_USERS[role]
+            response = requests.post(
+                f"{base_url}/login",
+                data={"username": username, "password": password},
+                timeout=timeout
+            )
+            response.raise_for_status()
+            tokens[role] = response.json()["access_token"]
+        return tokens[role]
+
+    def run(role: str, query: str) -> dict:
+        headers = {"Authorization": f"Bearer {login(role)}"}
+
+        start = time.perf_counter()
+        error = None
+        stages = {}
+        try:
+            response = requests.post(
+                f"{base_url}/chat",
+                json={"query": query},
+                headers=headers,
+                timeout=timeout
+            )
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+            stages = parse_server_timing(response.headers.get("Server-Timing"))
+        except Exception as exc:
+            error = repr(exc)
+
+        return {
+            "role": role,
+            "query": query,
+            "total": time.perf_counter() - start,
+            "stages": stages,
+            "error": error
+        }
+
+    return login, run
+
+
+def run_benchmark(run_one, workload: list, concurrency: int, repeat: int, warmup: int, seed: int):
+    requests_to_run = workload * repeat
+    random.Random(seed).shuffle(requests_to_run)
+
+    # Warmup requests load models and fill caches; they are not reported
+    for role, query in workload[:warmup]:
+        run_one(role, query)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda item: run_one(*item), requests_to_run))
+    return samples, time.perf_counter() - start
+
+
+def load_retrieval_workload(path: str = None, chunks_path: str = CHUNKS_PATH) -> list:
+    """
+    Items are {"role", "query"} plus either "relevant" (chunk ids) or
+    "expected_text", which is resolved against chunks.jsonl here.
+    """
+    items = DEFAULT_RETRIEVAL_WORKLOAD
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f if line.strip()]
+
+    resolved = []
+    for item in items:
+        role = item["role"].lower()
+        relevant = item.get("relevant")
+        if relevant is None:
+            needle = item["expected_text"].lower()
+            relevant = [
+                c["chunk_id"] for c in chunks
+                if needle in c["text"].lower()
+                and role in {r.lower() for r in c.get("accessible_roles", [])}
+            ]
+        if relevant:
+            resolved.append({"role": role, "query": item["query"], "relevant": set(relevant)})
+        else:
+            print(f"Skipping query with no relevant chunks: {item['query']}")
+    return resolved
+
+
+def run_retrieval_benchmark(items: list, modes: list, k: int, repeat: int, rerank_top_n: int = 0) -> dict:
+    """
+    With rerank_top_n, each mode is also measured with its top rerank_top_n
+    hits re-scored by the cross-encoder (no time budget) as "<mode>+rerank".
+    """
+    from milestone_3.search_service import embed_query, search_with_rbac
+
+    # Embeddings are shared by every mode and kept out of the timings
+    embeddings = [embed_query(item["query"]) for item in items]
+    for item, embedding in zip(items, embeddings):
+        search_with_rbac(item["query"], item["role"], k=k, query_embedding=embedding)
+
+    variants = [(mode, False) for mode in modes]
+    if rerank_top_n:
+        from milestone_3.reranker import get_rerank_model, rerank
+        get_rerank_model()
+        variants += [(mode, True) for mode in modes]
+
+    results = {}
+    for mode, use_rerank in variants:
+        recalls, hits, reciprocal_ranks, timings = [], [], [], []
+        for _ in range(repeat):
+            for item, embedding in zip(items, embeddings):
+                start = time.perf_counter()
+                found = search_with_rbac(
+                    item["query"], item["role"], k=max(k, rerank_top_n) if use_rerank else k,
+                    query_embedding=embedding, mode=mode
+                )
+                if use_rerank:
+                    candidates = found[:rerank_top_n]
+                    found, reranked = rerank(item["query"], candidates, budget_ms=None)
+                    if not reranked and len(candidates) > 1:
+                        # Otherwise the +rerank rows silently repeat the baseline
+                        raise RuntimeError(f"Re-ranking failed for query {item['query']!r}")
+                found = found[:k]
+                timings.append(time.perf_counter() - start)
+
+                ids = [hit["chunk_id"] for hit in found]
+                relevant = item["relevant"]
+                recalls.append(len(relevant.intersection(ids)) / min(len(relevant), k))
+                hits.append(any(chunk_id in relevant for chunk_id in ids))
+                first = next((rank for rank, chunk_id in enumerate(ids, start=1) if chunk_id in relevant), None)
+                reciprocal_ranks.append(1 / first if first else 0.0)
+
+        results[mode + ("+rerank" if use_rerank else "")] = {
+            f"recall@{k}": round(sum(recalls) / len(recalls), 3),
+            f"hit_rate@{k}": round(sum(hits) / len(hits), 3),
+            "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 3),
+            "latency": summarize(timings)
+        }
+    return results
+
+
+def print_retrieval_report(results: dict, k: int):
+    print(f"\n{'mode':<16}{f'recall@{k}':>11}{f'hit@{k}':>9}{'mrr':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:<16}{stats[f'recall@{k}']:>11}{stats[f'hit_rate@{k}']:>9}{stats['mrr']:>8}"
+            f"{stats['latency']['p50_ms']:>10}{stats['latency']['p95_ms']:>10}"
+        )
+
+
+def build_generation_prompts(path: str = None) -> list:
+    """
+    The fixed evaluation set: a JSON list of prompts, or by default the
+    prompts rag builds for the labelled retrieval queries.
+    """
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    from milestone_3.rag import retrieve_context
+
+    prompts = []
+    for item in DEFAULT_RETRIEVAL_WORKLOAD:
+        context = retrieve_context(item["query"], item["role"].lower())
+        if context is not None:
+            prompts.append(context["prompt"])
+    return prompts
+
+
+def normalize_answer(text: str) -> list:
+    return text.lower().split()
+
+
+def run_generation_benchmark(prompts: list, backends: list, repeat: int) -> dict:
+    # The first backend's answers are the reference (torch = fp32 baseline)
+    from milestone_3.generation_backends import load_generator
+    from milestone_3.llm import MODEL_NAME, generate_batch
+
+    results = {}
+    reference = None
+    for backend in backends:
+        start = time.perf_counter()
+        try:
+            generator = load_generator(MODEL_NAME, backend)
+        except (ImportError, RuntimeError, ValueError) as exc:
+            # e.g. onnx without optimum installed; the other backends still run
+            print(f"Skipping {backend}: {exc}")
+            results[backend] = {"error": str(exc)}
+            continue
+        load_seconds = time.perf_counter() - start
+
+        generate_batch(prompts[:1], generator)   # warmup
+
+        answers, timings, generated = [], [], 0
+        for round_index in range(repeat):
+            for prompt in prompts:
+                start = time.perf_counter()
+                answer, _, tokens = generate_batch([prompt], generator)[0]
+                timings.append(time.perf_counter() - start)
+                if round_index == 0:
+                    answers.append(answer)
+                    generated += tokens
+
+        stats = {
+            "load_seconds": round(load_seconds, 2),
+            "latency": summarize(timings),
+            "generated_tokens_per_s": round(generated * repeat / sum(timings), 1) if timings else 0.0
+        }
+
+        if reference is None:
+            reference = answers
+        else:
+            exact = [normalize_answer(a) == normalize_answer(b) for a, b in zip(answers, reference)]
+            similarity = [
+                difflib.SequenceMatcher(None, normalize_answer(a), normalize_answer(b)).ratio()
+                for a, b in zip(answers, reference)
+            ]
+            stats["exact_match"] = round(sum(exact) / len(exact), 3)
+            stats["token_similarity"] = round(sum(similarity) / len(similarity), 3)
+            stats["differing"] = [
+                {"reference": b, "answer": a}
+                for a, b, same in zip(answers, reference, exact) if not same
+            ][:5]
+
+        results[backend] = stats
+        del generator
+
+    return results
+
+
+def print_generation_report(results: dict):
+    print(f"\n{'backend':<10}{'p50 ms':>10}{'p95 ms':>10}{'tok/s':>8}{'load s':>8}{'exact':>8}{'similar':>9}")
+    for backend, stats in results.items():
+        if "error" in stats:
+            print(f"{backend:<10}  skipped: {stats['error']}")
+            continue
+        print(
+            f"{backend:<10}{stats['latency']['p50_ms']:>10}{stats['latency']['p95_ms']:>10}"
+            f"{stats['generated_tokens_per_s']:>8}{stats['load_seconds']:>8}"
+            f"{stats.get('exact_match', '-'):>8}{stats.get('token_similarity', '-'):>9}"
+        )
+
+
+def load_embedding_texts(source: str, path: str = None, chunks_path: str = CHUNKS_PATH) -> list:
+    # queries: what embed_query sees per request; chunks: what the embedder encodes
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if source == "chunks":
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            return [json.loads(line)["text"] for line in f if line.strip()]
+    return [query for queries in DEFAULT_WORKLOAD.values() for query in queries]
+
+
+def run_embedding_benchmark(texts: list, backends: list, batch_sizes: list, repeat: int) -> dict:
+    # The first backend's vectors are the reference for the cosine columns
+    import numpy as np
+    from milestone_2.embedding_backend import load_embedder
+    from milestone_3.search_service import MODEL_NAME
+
+    results = {}
+    reference = None
+    for backend in backends:
+        start = time.perf_counter()
+        try:
+            embedder = load_embedder(MODEL_NAME, backend)
+        except (ImportError, RuntimeError, ValueError) as exc:
+            print(f"Skipping {backend}: {exc}")
+            results[backend] = {"error": str(exc)}
+            continue
+        load_seconds = time.perf_counter() - start
+
+        embedder.encode(texts[:8], batch_size=8)   # warmup
+
+        by_batch = {}
+        for batch_size in batch_sizes:
+            # Cycle the texts so every batch is full
+            batch = [texts[i % len(texts)] for i in range(batch_size)]
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                embedder.encode(batch, batch_size=batch_size)
+                timings.append(time.perf_counter() - start)
+            by_batch[batch_size] = {
+                "latency": summarize(timings),
+                "texts_per_s": round(batch_size * len(timings) / sum(timings), 1)
+            }
+
+        vectors = np.asarray(embedder.encode(texts, batch_size=max(batch_sizes)), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        stats = {"load_seconds": round(load_seconds, 2), "batches": by_batch}
+        if reference is None:
+            reference = vectors
+        else:
+            cosines = (vectors * reference).sum(axis=1)
+            stats["cosine_min"] = round(float(cosines.min()), 5)
+            stats["cosine_mean"] = round(float(cosines.mean()), 5)
+
+        results[backend] = stats
+        del embedder
+
+    return results
+
+
+def print_embedding_report(results: dict):
+    for backend, stats in results.items():
+        if "error" in stats:
+            print(f"\n{backend}: skipped: {stats['error']}")
+            continue
+        print(
+            f"\n{backend}  load {stats['load_seconds']} s"
+            f"  cosine vs reference min {stats.get('cosine_min', '-')} mean {stats.get('cosine_mean', '-')}"
+        )
+        print(f"{'batch':>8}{'p50 ms':>10}{'p95 ms':>10}{'texts/s':>10}")
+        for batch_size, row in stats["batches"].items():
+            print(f"{batch_size:>8}{row['latency']['p50_ms']:>10}{row['latency']['p95_ms']:>10}{row['texts_per_s']:>10}")
+
+
+def print_report(report: dict):
+    print(f"\nMode: {report['mode']}  requests: {report['requests']}  errors: {report['errors']}")
+    print(f"Throughput: {report['throughput_rps']} req/s over {report['wall_seconds']} s")
+
+    rows = [("total", report["latency"])] + list(report["stages"].items())
+    print(f"\n{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name, stats in rows:
+        print(f"{name:<16}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['mean_ms']:>10}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RAG latency benchmark")
+    parser.add_argument("mode", choices=["pipeline", "http", "retrieval", "generation", "embedding"])
+    parser.add_argument("--workload", help="JSON workload file (default: built-in sample queries)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="Times the workload is replayed")
+    parser.add_argument("--warmup", type=int, default=2, help="Unreported requests sent first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend URL for http mode")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="pipeline mode: disable the answer cache so every request generates"
+    )
+    parser.add_argument("--k", type=int, default=5, help="retrieval mode: results per query")
+    parser.add_argument(
+        "--modes", default="vector,lexical,hybrid",
+        help="retrieval mode: comma-separated retrieval modes to compare"
+    )
+    parser.add_argument(
+        "--rerank", type=int, default=0, metavar="N",
+        help="retrieval mode: also measure each mode with its top N re-ranked by the cross-encoder"
+    )
+    parser.add_argument(
+        "--backends", default="torch,int8,onnx",
+        help="generation/embedding mode: backends to compare; the first is the reference"
+    )
+    parser.add_argument(
+        "--batch-sizes", default="1,2,4,8,16,32,64,128,256",
+        help="embedding mode: comma-separated batch sizes"
+    )
+    parser.add_argument(
+        "--texts", choices=["queries", "chunks"], default="queries",
+        help="embedding mode: sample queries or chunk texts from chunks.jsonl"
+    )
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.mode == "retrieval":
+        items = load_retrieval_workload(args.workload)
+        modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+        results = run_retrieval_benchmark(items, modes, args.k, args.repeat, args.rerank)
+        print_retrieval_report(results, args.k)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"mode": "retrieval", "k": args.k, "queries": len(items), "results": results}, f, indent=2)
+            print(f"\nSaved report to: {args.output}")
+        return
+
+    if args.mode == "generation":
+        prompts = build_generation_prompts(args.workload)
+        backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+        results = run_generation_benchmark(prompts, backends, args.repeat)
+        print_generation_report(results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"mode": "generation", "prompts": len(prompts), "results": results}, f, indent=2)
+            print(f"\nSaved report to: {args.output}")
+        return
+
+    if args.mode == "embedding":
+        texts = load_embedding_texts(args.texts, args.workload)
+        backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+        batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+        results = run_embedding_benchmark(texts, backends, batch_sizes, max(args.repeat, 3))
+        print_embedding_report(results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"mode": "embedding", "texts": args.texts, "results": results}, f, indent=2)
+            print(f"\nSaved report to: {args.output}")
+        return
+
+    workload = load_workload(args.workload)
+
+    config = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "workload": args.workload or "default",
+        "queries": len(workload),
+        "concurrency": args.concurrency,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "seed": args.seed
+    }
+
+    if args.mode == "pipeline":
+        if args.no_cache:
+            from milestone_3.answer_cache import answer_cache
+            answer_cache.max_entries = 0
+        config["cache"] = not args.no_cache
+        run_one = run_pipeline_request
+    else:
+        config["url"] = args.url
+        login, run_one = make_http_runner(args.url.rstrip("/"), args.timeout)
+        for role in {role for role, _ in workload}:
+            login(role)
+
+    samples, wall_seconds = run_benchmark(
+        run_one, workload, args.concurrency, args.repeat, args.warmup, args.seed
+    )
+
+    report = build_report(args.mode, config, samples, wall_seconds)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
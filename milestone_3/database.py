@@ -1,9 +1,117 @@
 import sqlite3
+import threading
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / "users.db"
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+# One connection per thread, reused across requests. sqlite3 connections
+# must stay on the thread that created them, and the threadpool and
+# executors keep their threads alive, so in practice this is a small pool.
+_local = threading.local()
+
+# Per-connection cache of compiled statements, keyed by SQL text; every
+# query below is a constant string, so each is prepared once per thread
+STATEMENT_CACHE_SIZE = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE,
+    password TEXT,
+    role TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users (role COLLATE NOCASE);
+"""
+
+FIND_USER = "SELECT username, password, role FROM users WHERE username = ?"
+LIST_USERS = "SELECT username, role FROM users ORDER BY id LIMIT ? OFFSET ?"
+COUNT_USERS = "SELECT COUNT(*) FROM users"
+COUNT_ROLE = "SELECT COUNT(*) FROM users WHERE role = ? COLLATE NOCASE"
+INSERT_USER = "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)"
+DELETE_USER = "DELETE FROM users WHERE username = ?"
+
+
+def connect():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=5.0,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        isolation_level=None   # autocommit; writes that need it use BEGIN IMMEDIATE
+    )
     conn.row_factory = sqlite3.Row
+    # WAL lets logins read while an admin write is in progress, across
+    # uvicorn workers too
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
+
+
+def get_db():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = connect()
+        _local.conn = conn
+    return conn
+
+
+def create_schema():
+    get_db().executescript(SCHEMA)
+
+
+# ================= USER REPOSITORY =================
+
+def find_user(username: str):
+    return get_db().execute(FIND_USER, (username,)).fetchone()
+
+
+def list_users(limit: int, offset: int = 0) -> list:
+    return get_db().execute(LIST_USERS, (limit, offset)).fetchall()
+
+
+def count_users() -> int:
+    return get_db().execute(COUNT_USERS).fetchone()[0]
+
+
+def add_users(users: list) -> int:
+    """
+    users: [(username, hashed_password, role), ...]. Existing usernames are
+    left untouched; returns how many rows were inserted.
+    """
+    conn = get_db()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        before = conn.total_changes
+        conn.executemany(INSERT_USER, users)
+        return conn.total_changes - before
+
+
+def add_user(username: str, hashed_password: str, role: str) -> bool:
+    return add_users([(username, hashed_password, role)]) == 1
+
+
+def delete_user(username: str):
+    """
+    Returns None on success, otherwise (status_code, detail) for the error.
+    """
+    conn = get_db()
+    # The last-C-Level check and the delete happen in one write transaction
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        user = conn.execute(FIND_USER, (username,)).fetchone()
+        if not user:
+            return 404, "User not found"
+
+        # Prevent deleting last C-Level
+        if user["role"].lower() == "c-level":
+            if conn.execute(COUNT_ROLE, ("c-level",)).fetchone()[0] <= 1:
+                return 400, "Cannot delete last C-Level user"
+
+        conn.execute(DELETE_USER, (username,))
+    return None
+
+
+def close_db():
+    conn = getattr(_local, "conn", None)
+    _local.conn = None
+    if conn is not None:
+        conn.close()
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+from collections import defaultdict
+
+from milestone_3.answer_cache import INDEX_VERSION_PATH, read_index_version
+from milestone_3.rbac import RBAC_RULES
+
+# Built from the ingestion output rather than data/raw, so the sidebar lists
+# exactly what retrieval can return for each role
+CHUNKS_PATH = "data/processed/chunks.jsonl"
+
+# The watcher stats CHUNKS_PATH and INDEX_VERSION_PATH this often and
+# rebuilds when either changes; requests never touch the filesystem
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "10"))
+
+
+def file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def read_chunk_records(path: str = CHUNKS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield {
+                    "source_document": record["source_document"],
+                    "department": record["department"],
+                    "roles": record.get("accessible_roles", []),
+                    "token_count": record.get("token_count", 0),
+                    "characters": len(record.get("text", ""))
+                }
+
+
+def read_collection_records():
+    # Fallback when chunks.jsonl is gone but the vector store is still there
+    from milestone_3.search_service import get_collection, role_flag_key
+
+    metadatas = get_collection().get(include=["metadatas"])["metadatas"]
+    for meta in metadatas:
+        yield {
+            "source_document": meta["source_document"],
+            "department": meta["department"],
+            "roles": [role for role in RBAC_RULES if meta.get(role_flag_key(role))],
+            "token_count": meta.get("token_count", 0),
+            "characters": 0
+        }
+
+
+def build_catalog(records) -> dict:
+    """
+    Returns {role: {"documents": {Department: [file, ...]},
+                    "detailed": {Department: [{name, chunks, tokens, characters}, ...]}}}
+    with role keys lowercased.
+    """
+    stats = {}                          # (department, document) -> totals
+    role_documents = defaultdict(set)   # role -> {(department, document)}
+
+    for record in records:
+        key = (record["department"], record["source_document"])
+        entry = stats.setdefault(key, {"chunks": 0, "tokens": 0, "characters": 0})
+        entry["chunks"] += 1
+        entry["tokens"] += record["token_count"]
+        entry["characters"] += record["characters"]
+
+        for role in record["roles"]:
+            role_documents[role.lower()].add(key)
+
+    catalog = {}
+    for role, keys in role_documents.items():
+        documents = defaultdict(list)
+        detailed = defaultdict(list)
+        for department, name in sorted(keys):
+            documents[department].append(name)
+            detailed[department].append({"name": name, **stats[(department, name)]})
+        catalog[role] = {"documents": dict(documents), "detailed": dict(detailed)}
+
+    return catalog
+
+
+class DocumentCatalog:
+    def __init__(self, chunks_path: str = CHUNKS_PATH, poll_seconds: float = CATALOG_POLL_SECONDS):
+        self.chunks_path = chunks_path
+        self.poll_seconds = poll_seconds
+        self._catalog = None
+        self._signature = None
+        self._build_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _current_signature(self):
+        return file_signature(self.chunks_path), read_index_version(INDEX_VERSION_PATH)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuilds the catalog if the ingestion output changed (or force).
+        Also the hook to call after re-running the chunker/embedder in-process.
+        """
+        with self._build_lock:
+            signature = self._current_signature()
+            if not force and self._catalog is not None and signature == self._signature:
+                return False
+
+            if signature[0] is not None:
+                records = read_chunk_records(self.chunks_path)
+            else:
+                records = read_collection_records()
+
+            try:
+                catalog = build_catalog(records)
+            except Exception as exc:
+                print(f"Document catalog rebuild failed: {exc!r}")
+                if self._catalog is None:
+                    self._catalog = {}
+                return False
+
+            # Swapped in one assignment; readers see either the old or the new catalog
+            self._catalog = catalog
+            self._signature = signature
+            print(f"Document catalog built for {len(catalog)} roles.")
+            return True
+
+    def start(self):
+        self.refresh()
+        if self._watcher is None and self.poll_seconds > 0:
+            self._watcher = threading.Thread(
+                target=self._watch, name="document-catalog", daemon=True
+            )
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.refresh()
+
+    def accessible_documents(self, role: str, detailed: bool = False) -> dict:
+        if self._catalog is None:
+            self.refresh()
+        entry = self._catalog.get(role.lower())
+        if entry is None:
+            return {}
+        return entry["detailed"] if detailed else entry["documents"]
+
+
+document_catalog = DocumentCatalog()
@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated, bounded pools for the CPU-heavy stages. Keeping them apart
+# from each other and from Starlette's default threadpool means a burst of
+# /chat traffic cannot starve logins, and neither can starve /health or /me.
+EMBED_POOL_SIZE = int(os.getenv("EMBED_POOL_SIZE", "2"))
+GENERATE_POOL_SIZE = int(os.getenv("GENERATE_POOL_SIZE", "2"))
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", "2"))
+LEXICAL_POOL_SIZE = int(os.getenv("LEXICAL_POOL_SIZE", "2"))
+
+# Query embedding and the Chroma query
+embed_executor = ThreadPoolExecutor(
+    max_workers=EMBED_POOL_SIZE, thread_name_prefix="embed"
+)
+
+# Streaming generate() calls; batched generation runs on llm.batcher's worker
+generate_executor = ThreadPoolExecutor(
+    max_workers=GENERATE_POOL_SIZE, thread_name_prefix="generate"
+)
+
+# BM25 lookups, run alongside the Chroma query in hybrid retrieval
+lexical_executor = ThreadPoolExecutor(
+    max_workers=LEXICAL_POOL_SIZE, thread_name_prefix="lexical"
+)
+
+# Cross-encoder re-ranking; one worker, so a slow batch makes later
+# requests fall back instead of piling up
+rerank_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="rerank"
+)
+
+# bcrypt hashing and verification
+hash_executor = ThreadPoolExecutor(
+    max_workers=HASH_POOL_SIZE, thread_name_prefix="hash"
+)
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    # Like asyncio.to_thread, but on a specific pool; contextvars are
+    # carried over so per-request state survives the hop
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+def submit_in(executor, fn, *args, **kwargs):
+    # Thread-side counterpart of run_in, for fanning out from a worker thread
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
+
+
+def shutdown_executors():
+    for executor in (embed_executor, generate_executor, lexical_executor, rerank_executor, hash_executor):
+        executor.shutdown(wait=False, cancel_futures=True)
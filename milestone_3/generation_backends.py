@@ -0,0 +1,84 @@
+import os
+
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+# Selected with GENERATION_BACKEND:
+#   torch  fp32 eager PyTorch (the original path)
+#   int8   PyTorch with dynamic int8 quantization of every nn.Linear
+#   onnx   ONNX Runtime encoder/decoder with KV cache, via optimum
+#          (pip install optimum[onnxruntime]; exported once to ONNX_EXPORT_DIR)
+# All three expose the same tokenizer/model.generate() interface to llm.py.
+BACKENDS = ("torch", "int8", "onnx")
+GENERATION_BACKEND = os.getenv("GENERATION_BACKEND", "torch").lower()
+
+# Intra-op threads for PyTorch / ONNX Runtime; 0 keeps the library default
+GENERATION_THREADS = int(os.getenv("GENERATION_THREADS", "0"))
+
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", "data/onnx")
+
+
+def configure_threads(threads: int = GENERATION_THREADS):
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+
+def load_torch(model_name: str):
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    model.eval()
+    return model
+
+
+def load_int8(model_name: str):
+    # Weights are stored int8 and activations quantized on the fly; the
+    # Linear layers are where flan-t5 spends nearly all of its CPU time
+    return torch.quantization.quantize_dynamic(
+        load_torch(model_name), {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_onnx(model_name: str, threads: int = GENERATION_THREADS):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as exc:
+        raise RuntimeError(
+            "GENERATION_BACKEND=onnx needs optimum[onnxruntime] installed"
+        ) from exc
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads > 0:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+
+    export_dir = os.path.join(ONNX_EXPORT_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            export_dir, use_cache=True, session_options=options
+        )
+
+    print(f"Exporting {model_name} to ONNX (first run only)...")
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        model_name, export=True, use_cache=True, session_options=options
+    )
+    model.save_pretrained(export_dir)
+    return model
+
+
+def load_generator(model_name: str, backend: str = GENERATION_BACKEND):
+    """Returns (tokenizer, model) for the requested backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown GENERATION_BACKEND {backend!r}; expected one of {BACKENDS}")
+
+    configure_threads()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    if backend == "int8":
+        model = load_int8(model_name)
+    elif backend == "onnx":
+        model = load_onnx(model_name)
+    else:
+        model = load_torch(model_name)
+
+    return tokenizer, model
@@ -1,23 +1,10 @@
-import sqlite3
-from pathlib import Path
+from milestone_3.database import add_users, create_schema, find_user
 from milestone_3.models import hash_password
 
-DB_PATH = Path(__file__).parent / "users.db"
-
 def init_db():   # 👈 renamed from main()
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("DROP TABLE IF EXISTS users")
-    cursor.execute("""
-    CREATE TABLE users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE,
-        password TEXT,
-        role TEXT
-    )
-    """)
+    # Keeps existing users; only the demo accounts that are missing get created
+    create_schema()
 
     users = [
         ("hr", "1234", "HR"),
@@ -28,16 +15,11 @@ def init_db():   # 👈 renamed from main()
         ("ceo", "1234", "C-Level")
     ]
 
+    # bcrypt is slow, so existing accounts are not re-hashed on every startup
     hashed_users = [
-        (u, hash_password(p), r) for (u, p, r) in users
+        (u, hash_password(p), r) for (u, p, r) in users if find_user(u) is None
     ]
 
-    cursor.executemany(
-        "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-        hashed_users
-    )
-
-    conn.commit()
-    conn.close()
+    added = add_users(hashed_users)
 
-    print("Database initialized successfully.")
+    print(f"Database initialized successfully ({added} demo users added).")
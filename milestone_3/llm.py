@@ -1,37 +1,380 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer, TextStreamer
 import torch
 
+from milestone_3.executors import generate_executor, run_in
+from milestone_3.generation_backends import GENERATION_BACKEND, load_generator
+from milestone_3.model_client import get_model_client
+from milestone_3.metrics import (
+    CallbackMetric, GENERATED_TOKENS, GENERATION_BATCH_SIZE,
+    GENERATION_QUEUE_WAIT, PROMPT_TOKENS
+)
+from milestone_3.tracing import record_count
+
 MODEL_NAME = "google/flan-t5-base"
 
+# Micro-batching: prompts arriving within BATCH_WAIT_MS of each other are
+# padded together and run through a single generate() call
+MAX_BATCH_SIZE = int(os.getenv("GENERATION_MAX_BATCH_SIZE", "8"))
+BATCH_WAIT_MS = float(os.getenv("GENERATION_BATCH_WAIT_MS", "25"))
+
+# flan-t5-base was trained on 512-token inputs; rag's prompt builder fits
+# prompts to this, and truncation here is only a safety net
+MAX_INPUT_TOKENS = 512
+
+# Longest wait for the next streamed token before a local stream gives up
+STREAM_TOKEN_TIMEOUT_S = float(os.getenv("GENERATION_STREAM_TOKEN_TIMEOUT_S", "60"))
+
 tokenizer = None
 model = None
+_load_lock = threading.Lock()
 
 def load_model():
     global tokenizer, model
-    if tokenizer is None or model is None:
-        print("Loading FLAN-T5 model...")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-        model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
+    if tokenizer is not None and model is not None:
+        return
+    # The batcher worker and streaming requests can race to the first load
+    with _load_lock:
+        if tokenizer is None or model is None:
+            print(f"Loading FLAN-T5 model ({GENERATION_BACKEND} backend)...")
+            tokenizer, model = load_generator(MODEL_NAME, GENERATION_BACKEND)
+
+
+def generate_batch(prompts: list, generator: tuple = None) -> list:
+    """
+    Returns (answer, prompt_tokens, generated_tokens) for each prompt.
+    generator is an optional (tokenizer, model) pair; the benchmark passes
+    one per backend, everything else uses the loaded model.
+    """
+    if generator is None:
+        load_model()
+        generator = (tokenizer, model)
+    tok, mdl = generator
+
+    inputs = tok(
+        prompts,
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=MAX_INPUT_TOKENS
+    )
+
+    with torch.no_grad():
+        outputs = mdl.generate(
+            **inputs,
+            max_new_tokens=256,
+            do_sample=False
+        )
+
+    answers = tok.batch_decode(outputs, skip_special_tokens=True)
+
+    results = []
+    for answer, mask, output in zip(answers, inputs["attention_mask"], outputs):
+        prompt_tokens = int(mask.sum())
+        # Padding (which T5 also uses as the decoder start token) is not counted
+        generated_tokens = int((output != tok.pad_token_id).sum())
+        PROMPT_TOKENS.observe(prompt_tokens, mode="batch")
+        GENERATED_TOKENS.observe(generated_tokens, mode="batch")
+        results.append((answer.strip(), prompt_tokens, generated_tokens))
+
+    return results
+
+
+class GenerationBatcher:
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = BATCH_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    def submit(self, prompt: str) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((prompt, future, time.perf_counter()))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="generation-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _collect_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+
+            # Callers that gave up (cancelled futures) are dropped from the batch
+            live = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            self._record(len(live), [started - enqueued for _, _, enqueued in live])
+
+            if not live:
+                continue
+
+            try:
+                results = generate_batch([prompt for prompt, _, _ in live])
+            except Exception as exc:
+                for _, future, _ in live:
+                    future.set_exception(exc)
+                continue
+
+            for (_, future, _), result in zip(live, results):
+                future.set_result(result)
+
+    def _record(self, batch_size: int, waits: list):
+        if batch_size:
+            GENERATION_BATCH_SIZE.observe(batch_size)
+        for wait in waits:
+            GENERATION_QUEUE_WAIT.observe(wait)
+
+        with self._stats_lock:
+            if batch_size:
+                self._batch_sizes[batch_size] += 1
+            self._requests += len(waits)
+            self._queue_wait_total += sum(waits)
+            self._queue_wait_max = max([self._queue_wait_max] + waits)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "batch_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "requests": self._requests,
+                "avg_batch_size": round(self._requests / batches, 2) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": round(1000 * self._queue_wait_total / self._requests, 2) if self._requests else 0.0,
+                "max_queue_wait_ms": round(1000 * self._queue_wait_max, 2),
+                "queue_depth": self._queue.qsize()
+            }
+
+
+batcher = GenerationBatcher()
+
+CallbackMetric(
+    "llm_generation_queue_depth",
+    "Prompts waiting for the micro-batcher",
+    "gauge",
+    lambda: {(): batcher.stats()["queue_depth"]}
+)
+
+
+def get_generation_stats() -> dict:
+    return batcher.stats()
+
+
+def finish_answer(result: tuple) -> str:
+    answer, prompt_tokens, generated_tokens = result
+    record_count("prompt_tokens", prompt_tokens)
+    record_count("generated_tokens", generated_tokens)
+    return answer if answer else "I don't know"
+
 
 def generate_answer(prompt: str):
-    load_model()   # 🔥 load only when first needed
+    remote = get_model_client()
+    if remote is not None:
+        result = remote.generate(prompt)
+    else:
+        # Blocks until the batch containing this prompt has been generated
+        result = batcher.submit(prompt).result()
+
+    return finish_answer(result)
+
+
+async def generate_answer_async(prompt: str):
+    remote = get_model_client()
+    if remote is not None:
+        result = await run_in(generate_executor, remote.generate, prompt)
+    else:
+        # Awaits the batcher's future directly, so no thread is held while waiting
+        result = await asyncio.wrap_future(batcher.submit(prompt))
+
+    return finish_answer(result)
+
+
+def stream_answer(prompt: str):
+    remote = get_model_client()
+    if remote is not None:
+        return remote.stream(prompt)
+    return stream_answer_local(prompt)
+
+
+class CancelCriteria(StoppingCriteria):
+    # Ends generate() at the next token once cancel is set
+    def __init__(self, cancel: threading.Event):
+        self.cancel = cancel
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancel.is_set()
+
+
+def stream_answer_local(prompt: str):
+    # Streaming runs outside the batcher: one generate() per caller, with
+    # decoded text handed back as soon as each token is produced
+    load_model()
 
     inputs = tokenizer(
         prompt,
         return_tensors="pt",
         truncation=True,
-        max_length=2048
+        max_length=MAX_INPUT_TOKENS
     )
 
-    outputs = model.generate(
-        **inputs,
-        max_new_tokens=256,
-        do_sample=False
+    # A stalled generate() surfaces as queue.Empty instead of a hung request
+    streamer = TextIteratorStreamer(
+        tokenizer,
+        skip_special_tokens=True,
+        timeout=STREAM_TOKEN_TIMEOUT_S
     )
+    failure = []
+    # Set when the caller stops reading (closed generator, dropped socket)
+    cancel = threading.Event()
 
-    answer = tokenizer.decode(
-        outputs[0],
-        skip_special_tokens=True
-    ).strip()
+    def run_generate():
+        try:
+            model.generate(
+                **inputs,
+                streamer=streamer,
+                max_new_tokens=256,
+                do_sample=False,
+                stopping_criteria=StoppingCriteriaList([CancelCriteria(cancel)])
+            )
+        except BaseException as exc:
+            # Unblock the consumer; the error is re-raised on its side
+            failure.append(exc)
+            streamer.end()
 
-    return answer if answer else "I don't know"
+    worker = threading.Thread(target=run_generate, daemon=True)
+    worker.start()
+
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        cancel.set()
+
+    worker.join()
+    if failure:
+        raise failure[0]
+
+
+class CallbackStreamer(TextStreamer):
+    # Hands each decoded piece of text to on_text; None marks the end
+    def __init__(self, tokenizer, on_text):
+        super().__init__(tokenizer, skip_special_tokens=True)
+        self.on_text = on_text
+        self.token_count = 0
+
+    def put(self, value):
+        self.token_count += int(value.numel())
+        super().put(value)
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_text(text)
+        if stream_end:
+            self.on_text(None)
+
+
+async def stream_answer_async(prompt: str):
+    loop = asyncio.get_running_loop()
+    pieces = asyncio.Queue()
+    # Set when the consumer goes away, so generate() frees its executor slot
+    cancel = threading.Event()
+
+    def on_text(text):
+        loop.call_soon_threadsafe(pieces.put_nowait, text)
+
+    def run_generate():
+        try:
+            remote = get_model_client()
+            if remote is not None:
+                for text in remote.stream(prompt):
+                    if cancel.is_set():
+                        # Closing the stream drops the connection, which
+                        # stops generation on the model server too
+                        break
+                    on_text(text)
+                return
+
+            # The first call loads the model, on this pool rather than the event loop
+            load_model()
+
+            inputs = tokenizer(
+                prompt,
+                return_tensors="pt",
+                truncation=True,
+                max_length=MAX_INPUT_TOKENS
+            )
+
+            streamer = CallbackStreamer(tokenizer, on_text)
+            model.generate(
+                **inputs,
+                streamer=streamer,
+                max_new_tokens=256,
+                do_sample=False,
+                stopping_criteria=StoppingCriteriaList([CancelCriteria(cancel)])
+            )
+
+            prompt_tokens = int(inputs["attention_mask"].sum())
+            # The first put() is the decoder start token
+            generated_tokens = max(streamer.token_count - 1, 0)
+            PROMPT_TOKENS.observe(prompt_tokens, mode="stream")
+            GENERATED_TOKENS.observe(generated_tokens, mode="stream")
+            record_count("prompt_tokens", prompt_tokens)
+            record_count("generated_tokens", generated_tokens)
+        finally:
+            # Unblocks the consumer even if generate() raised before the end
+            loop.call_soon_threadsafe(pieces.put_nowait, None)
+
+    # run_in carries the request's context, so token counts reach its log record
+    generation = asyncio.ensure_future(run_in(generate_executor, run_generate))
+
+    try:
+        while True:
+            text = await pieces.get()
+            if text is None:
+                break
+            yield text
+    finally:
+        # A consumer that stops early (client gone, request cancelled)
+        # closes this generator; generation stops at the next token
+        cancel.set()
+
+    # Re-raises any exception from generate()
+    await generation
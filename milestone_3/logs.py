@@ -1,13 +1,216 @@
+
 # milestone_3/logs.py
 
-from datetime import datetime
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from milestone_3.metrics import Counter
+
+try:
+    import fcntl
+except ImportError:     # Windows: rotation is only coordinated within one process
+    fcntl = None
+
+LOG_FILE = os.getenv("ACCESS_LOG_FILE", "milestone_3/access.log")
+
+# Records are queued by the request and written by a background thread,
+# at most every FLUSH_INTERVAL_SECONDS or FLUSH_BATCH_SIZE records
+FLUSH_INTERVAL_SECONDS = float(os.getenv("ACCESS_LOG_FLUSH_SECONDS", "1.0"))
+FLUSH_BATCH_SIZE = int(os.getenv("ACCESS_LOG_FLUSH_BATCH", "256"))
+MAX_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_MAX_QUEUE", "10000"))
+
+# access.log is rotated to access.log.1 (and older ones shifted up) once it
+# reaches ROTATE_MAX_BYTES or has been open for ROTATE_INTERVAL_SECONDS
+ROTATE_MAX_BYTES = int(os.getenv("ACCESS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+ROTATE_INTERVAL_SECONDS = int(os.getenv("ACCESS_LOG_ROTATE_SECONDS", str(24 * 3600)))
+BACKUP_COUNT = int(os.getenv("ACCESS_LOG_BACKUPS", "7"))
+
+DROPPED_RECORDS = Counter(
+    "access_log_dropped_total",
+    "Access log records dropped because the writer queue was full"
+)
+
+
+class AccessLogWriter:
+    """
+    Appends JSON lines to path from a single background thread.
+
+    Every uvicorn worker runs its own writer. They share the file safely:
+    each flush is one O_APPEND write made while holding an flock on
+    path + ".lock", and rotation happens under the same lock. The lock file
+    also stores when the current log was started, so every process agrees
+    on when the time-based rotation is due.
+    """
+
+    def __init__(self, path: str = LOG_FILE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._fd = None
+        self._inode = None
+
+    def write(self, record: dict):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on the log
+            DROPPED_RECORDS.inc()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="access-log", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                self._queue.task_done()
+                return
+
+            batch = [record]
+            deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+            stop = False
+            while len(batch) < FLUSH_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+
+            try:
+                self._flush(batch)
+            except Exception as exc:
+                print(f"Access log write failed: {exc!r}")
+
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _flush(self, batch: list):
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            for record in batch
+        ).encode("utf-8")
+
+        with open(self.lock_path, "a+", encoding="utf-8") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._rotate_if_due(lock_file, len(data))
+                self._open()
+                os.write(self._fd, data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open(self):
+        # Another process may have rotated the file since our last write
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+
+        if self._fd is not None and inode == self._inode:
+            return
+
+        if self._fd is not None:
+            os.close(self._fd)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+
+    def _rotate_if_due(self, lock_file, incoming: int):
+        lock_file.seek(0)
+        try:
+            started = float(lock_file.read().strip() or 0)
+        except ValueError:
+            started = 0.0
+
+        now = time.time()
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+
+        if not started:
+            self._set_started(lock_file, now)
+            started = now
+
+        too_big = size > 0 and size + incoming > ROTATE_MAX_BYTES
+        too_old = size > 0 and now - started >= ROTATE_INTERVAL_SECONDS
+        if not (too_big or too_old):
+            return
+
+        for index in range(BACKUP_COUNT - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if BACKUP_COUNT > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+        self._set_started(lock_file, now)
+
+    def _set_started(self, lock_file, timestamp: float):
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{timestamp}\n")
+        lock_file.flush()
+
+    def close(self, timeout: float = 5.0):
+        # Flushes everything queued so far, then stops the worker
+        if self._worker is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._worker.join(timeout)
+        self._worker = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+access_log = AccessLogWriter()
+atexit.register(access_log.close)
 
-LOG_FILE = "milestone_3/access.log"
 
-def log_access(username: str, role: str, query: str, confidence: float):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def log_access(username: str, role: str, query: str, confidence: float, **extra):
+    # Only builds a dict and enqueues it; serialization and I/O happen on
+    # the writer thread. extra carries per-request details such as
+    # endpoint, latency_ms, sources and token counts.
+    access_log.write({
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "username": username,
+        "role": role,
+        "query": query,
+        "confidence": confidence,
+        **extra
+    })
 
-    log_line = f'{timestamp} {username} {role} "{query}" {confidence}\n'
 
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(log_line)
+def close_access_log():
+    access_log.close()
@@ -1,26 +1,66 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from milestone_3.routes import router as auth_router
 from milestone_3.ai_routes import router as ai_router
+from milestone_3.auth import get_current_user
 from milestone_3.init_db import init_db
+from milestone_3.llm import get_generation_stats
+from milestone_3.executors import shutdown_executors
+from milestone_3.logs import close_access_log
+from milestone_3.document_catalog import document_catalog
+from milestone_3.metrics import render_metrics
+from milestone_3.startup import start_background_startup, startup_state
 
 app = FastAPI(title="Company Chatbot Backend")
 @app.on_event("startup")
 def startup_event():
-    init_db()
+    with startup_state.phase("init_db"):
+        init_db()
+    with startup_state.phase("document_catalog"):
+        document_catalog.start()
+    # Models load and warm up off the event loop; /ready reports progress
+    start_background_startup()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    shutdown_executors()
+    close_access_log()
+    document_catalog.stop()
 
 
 app.include_router(auth_router)
 app.include_router(ai_router)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Backend is running"}
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "OK"}
 
+@app.get("/ready")
+async def readiness_check():
+    # Liveness is /health; this is 503 until models are loaded and warmed up
+    state = startup_state.snapshot()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/generation")
+async def generation_stats(current_user: dict = Depends(get_current_user)):
+    # Operational detail, C-Level only like the /admin routes
+    if current_user["role"].lower() != "c-level":
+        raise HTTPException(status_code=403, detail="Access denied")
+    return get_generation_stats()
+
 
 
 #server command : uvicorn milestone_3.main:app --workers 2
+#shared models   : export MODEL_SERVER_AUTHKEY=$(openssl rand -hex 32) MODEL_SERVER_SOCKET=/run/rbac-chatbot/models.sock
+#                  python -m milestone_3.model_server
+#                  uvicorn milestone_3.main:app --workers 4
 #swagger command : http://127.0.0.1:8000/docs
\ No newline at end of file
@@ -0,0 +1,152 @@
+import threading
+from bisect import bisect_left
+
+# Minimal Prometheus text-format metrics, kept dependency-free. Values are
+# per process: with several uvicorn workers each one reports its own series.
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 384, 512, 768, 1024, 2048)
+BATCH_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+REGISTRY = []
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labelnames: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    labels = format_labels(self.labelnames, key, {"le": format_value(bound)})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {format_value(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    # Reads its values at scrape time from fn(), which returns
+    # {label values tuple: value}; used for state owned by other objects
+    def __init__(self, name: str, documentation: str, metric_type: str, fn, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        REGISTRY.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in sorted(self.fn().items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Latency of each request stage (embed, chroma_query, rbac_filter, prompt_build, generate, auth_verify, password_verify, ...)",
+    labelnames=("stage",)
+)
+
+RBAC_DROPPED_CHUNKS = Counter(
+    "rag_rbac_dropped_chunks_total",
+    "Retrieved chunks dropped by the post-query RBAC check"
+)
+
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Prompt length in generator tokens, after truncation",
+    labelnames=("mode",),
+    buckets=TOKEN_BUCKETS
+)
+
+GENERATED_TOKENS = Histogram(
+    "llm_generated_tokens",
+    "Tokens generated per answer",
+    labelnames=("mode",),
+    buckets=TOKEN_BUCKETS
+)
+
+GENERATION_BATCH_SIZE = Histogram(
+    "llm_generation_batch_size",
+    "Prompts per batched generate() call",
+    buckets=BATCH_BUCKETS
+)
+
+GENERATION_QUEUE_WAIT = Histogram(
+    "llm_generation_queue_wait_seconds",
+    "Time a prompt waited in the micro-batcher before its batch started"
+)
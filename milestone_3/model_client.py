@@ -0,0 +1,111 @@
+import os
+import threading
+from multiprocessing.connection import Client
+
+# When set, uvicorn workers send embedding and generation requests to the
+# shared model server (python -m milestone_3.model_server) on this Unix
+# socket instead of loading the models themselves
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET")
+
+# Requests are pickled, so the shared secret is what stops other local users
+# from running code in the model process. There is deliberately no default.
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY")
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+def require_authkey() -> bytes:
+    if not MODEL_SERVER_AUTHKEY:
+        raise ModelServerError(
+            "MODEL_SERVER_AUTHKEY must be set to a random secret shared by the "
+            "model server and the API workers"
+        )
+    return MODEL_SERVER_AUTHKEY.encode()
+
+
+class ModelServerClient:
+    def __init__(self, socket_path: str, authkey: bytes = None):
+        if authkey is None:
+            authkey = require_authkey()
+        self.socket_path = socket_path
+        self.authkey = authkey
+        # multiprocessing connections are not thread-safe, so each thread
+        # (one per pool worker) keeps its own
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _send(self, op: str, payload):
+        try:
+            conn = self._connection()
+            conn.send((op, payload))
+            return conn
+        except (OSError, EOFError):
+            self._drop_connection()
+            raise
+
+    def _recv(self, conn):
+        try:
+            status, result = conn.recv()
+        except (OSError, EOFError):
+            self._drop_connection()
+            raise
+
+        if status == "error":
+            raise ModelServerError(result)
+        return status, result
+
+    def call(self, op: str, payload):
+        conn = self._send(op, payload)
+        _, result = self._recv(conn)
+        return result
+
+    def embed(self, texts: list) -> list:
+        return self.call("embed", texts)
+
+    def generate(self, prompt: str) -> tuple:
+        # (answer, prompt_tokens, generated_tokens), as from llm.generate_batch
+        return self.call("generate", prompt)
+
+    def stream(self, prompt: str):
+        conn = self._send("stream", prompt)
+        finished = False
+        try:
+            while True:
+                status, text = self._recv(conn)
+                if status == "end":
+                    finished = True
+                    return
+                yield text
+        finally:
+            # An abandoned stream leaves unread tokens on the socket
+            if not finished:
+                self._drop_connection()
+
+
+_client = None
+
+
+def get_model_client():
+    global _client
+    if not MODEL_SERVER_SOCKET:
+        return None
+    if _client is None:
+        _client = ModelServerClient(MODEL_SERVER_SOCKET)
+    return _client
@@ -0,0 +1,127 @@
+"""
+Shared inference process for the embedding model and FLAN-T5.
+
+Run it once per host, then start the API workers pointed at the same socket:
+
+    export MODEL_SERVER_AUTHKEY=$(openssl rand -hex 32)
+    export MODEL_SERVER_SOCKET=/run/rbac-chatbot/models.sock
+    python -m milestone_3.model_server
+    uvicorn milestone_3.main:app --workers 4
+
+MODEL_SERVER_AUTHKEY is required. The socket's directory should only be
+accessible to the service user; without MODEL_SERVER_SOCKET the server uses
+a 0700 per-user directory under the system temp dir.
+
+The models are loaded once here instead of once per uvicorn worker.
+Generation requests from every worker go through the same micro-batcher,
+so concurrent users across workers share padded batches.
+"""
+import os
+import stat
+import tempfile
+import threading
+from multiprocessing.connection import Listener
+
+from milestone_3 import llm
+from milestone_3.model_client import (
+    MODEL_SERVER_SOCKET, ModelServerError, require_authkey
+)
+from milestone_3.search_service import embed_texts
+from milestone_3.startup import run_startup, startup_state
+
+
+def default_socket_path() -> str:
+    # A per-user 0700 directory, so other local users cannot reach the socket
+    directory = os.path.join(tempfile.gettempdir(), f"rbac-chatbot-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) & 0o077
+    ):
+        raise SystemExit(f"Refusing to use {directory}: not a private directory")
+    return os.path.join(directory, "models.sock")
+
+
+def handle_request(conn, op: str, payload):
+    if op == "embed":
+        conn.send(("ok", embed_texts(payload)))
+    elif op == "generate":
+        conn.send(("ok", llm.batcher.submit(payload).result()))
+    elif op == "stream":
+        stream = llm.stream_answer_local(payload)
+        try:
+            for text in stream:
+                conn.send(("token", text))
+        finally:
+            # A worker that hung up stops generation instead of leaving it
+            # to run to max_new_tokens
+            stream.close()
+        conn.send(("end", None))
+    elif op == "ping":
+        conn.send(("ok", "pong"))
+    else:
+        conn.send(("error", f"Unknown operation: {op}"))
+
+
+def handle_connection(conn):
+    # One thread per worker-side connection; each connection carries one
+    # request at a time
+    with conn:
+        while True:
+            try:
+                op, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                handle_request(conn, op, payload)
+            except (EOFError, OSError):
+                return
+            except Exception as exc:
+                conn.send(("error", repr(exc)))
+
+
+def serve(socket_path: str):
+    try:
+        authkey = require_authkey()
+    except ModelServerError as exc:
+        raise SystemExit(f"Model server failed to start: {exc}")
+
+    # Load and warm up before accepting connections, so no worker's first
+    # request waits on it
+    run_startup(local=True)
+    if not startup_state.ready:
+        raise SystemExit(f"Model server failed to start: {startup_state.error}")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # Create the socket owner-only from the start rather than chmod-ing it
+    # after it is already reachable
+    previous_umask = os.umask(0o177)
+    try:
+        listener = Listener(socket_path, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(socket_path, 0o600)
+    print(f"Model server listening on {socket_path}")
+
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as exc:
+                # A worker with the wrong authkey must not take the server down
+                print(f"Rejected connection: {exc!r}")
+                continue
+
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    serve(MODEL_SERVER_SOCKET or default_socket_path())
@@ -1,9 +1,12 @@
 from passlib.context import CryptContext
+from milestone_3.tracing import stage
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    with stage("password_hash"):
+        return pwd_context.hash(password)
 
 def verify_password(password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(password, hashed_password)
+    with stage("password_verify"):
+        return pwd_context.verify(password, hashed_password)
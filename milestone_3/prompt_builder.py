@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+from transformers import AutoTokenizer
+
+from milestone_2.lexical_index import tokenize as lexical_terms
+from milestone_3.llm import MODEL_NAME
+
+# flan-t5-base was trained on 512-token inputs; prompts are assembled to fit
+# rather than being truncated by the tokenizer (which cuts off the question)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "512"))
+
+# Sentences longer than this (wide CSV rows, long lists)
+# are split into word windows so they can be selected piecemeal
+MAX_SENTENCE_TOKENS = 64
+
+# Prose chunks have no newlines left after cleaning; CSV chunks keep one
+# row per line, so every row can be selected on its own
+SENTENCE_BOUNDARY = re.compile(r"\n+|(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+# Separate from llm.tokenizer: a fast tokenizer must not be shared with the
+# batcher, whose padding/truncation calls change its state. Loading it does
+# not load the model, so workers using the model server can count tokens too.
+tokenizer = None
+_load_lock = threading.Lock()
+
+
+class PromptTooLong(ValueError):
+    """The instructions and question alone do not fit the token budget."""
+
+
+def get_tokenizer():
+    global tokenizer
+    if tokenizer is None:
+        with _load_lock:
+            if tokenizer is None:
+                tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    return tokenizer
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer().encode(text, add_special_tokens=False))
+
+
+def split_long_sentence(sentence: str, tokens: int) -> list:
+    words = sentence.split()
+    pieces = -(-tokens // MAX_SENTENCE_TOKENS)
+    size = -(-len(words) // pieces)
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+@lru_cache(maxsize=4096)
+def chunk_sentences(text: str) -> tuple:
+    """
+    (sentence, token_count, terms) for each sentence of a chunk. Chunk text
+    is immutable between re-indexes, so this is tokenized once per chunk.
+    """
+    result = []
+    for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        tokens = count_tokens(sentence)
+        parts = [sentence] if tokens <= MAX_SENTENCE_TOKENS else split_long_sentence(sentence, tokens)
+        for part in parts:
+            part_tokens = tokens if len(parts) == 1 else count_tokens(part)
+            result.append((part, part_tokens, frozenset(lexical_terms(part))))
+    return tuple(result)
+
+
+def rank_sentences(query: str, chunks: list) -> list:
+    """
+    [(score, chunk_index, sentence_index), ...], best first. Sentences are
+    scored by query-term overlap; the chunk's retrieval rank breaks ties and
+    keeps a relevant chunk's sentences ahead of a weaker chunk's.
+    """
+    query_terms = set(lexical_terms(query))
+    ranked = []
+    for c, chunk in enumerate(chunks):
+        prior = 1.0 / (c + 1)
+        for s, (_, _, terms) in enumerate(chunk_sentences(chunk["text"])):
+            overlap = len(query_terms & terms)
+            ranked.append((overlap + prior, c, s))
+    ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+    return ranked
+
+
+def render_context(chunks: list, selected: set) -> str:
+    # Chosen sentences keep their original order; one bullet per chunk
+    lines = []
+    for c, chunk in enumerate(chunks):
+        sentences = [
+            sentence for s, (sentence, _, _) in enumerate(chunk_sentences(chunk["text"]))
+            if (c, s) in selected
+        ]
+        if sentences:
+            lines.append("- " + " ".join(sentences))
+    return "\n".join(lines)
+
+
+def fit_context(query: str, chunks: list, render_prompt, budget: int = PROMPT_TOKEN_BUDGET):
+    """
+    render_prompt(context) -> full prompt. Returns (prompt, indexes of the
+    chunks that contributed). The instructions and question are always kept
+    whole; only context sentences are left out. Raises PromptTooLong when
+    they do not fit on their own, rather than let the generator's
+    truncation cut off the question.
+    """
+    # +1 for the </s> the tokenizer appends
+    fixed = count_tokens(render_prompt("")) + 1
+    if fixed > budget:
+        raise PromptTooLong(
+            f"Question is too long: the prompt needs {fixed} tokens without "
+            f"any context and the limit is {budget}"
+        )
+    available = budget - fixed
+
+    ranked = rank_sentences(query, chunks)
+    selected = []
+    used = 0
+    for _, c, s in ranked:
+        tokens = chunk_sentences(chunks[c]["text"])[s][1]
+        # Bullets and joins add about a token per sentence
+        if used + tokens + 1 > available:
+            continue
+        selected.append((c, s))
+        used += tokens + 1
+
+    # Per-piece counts are an estimate; check the real total and drop the
+    # lowest-ranked sentences until it fits
+    while True:
+        prompt = render_prompt(render_context(chunks, set(selected)))
+        if not selected or count_tokens(prompt) + 1 <= budget:
+            break
+        selected.pop()
+
+    return prompt, sorted({c for c, _ in selected})
@@ -1,13 +1,20 @@
-from milestone_3.search_service import search_with_rbac
-from milestone_3.llm import generate_answer
+import asyncio
 
+from milestone_3.search_service import embed_queries, embed_query, search_with_rbac, search_with_rbac_batch
+from milestone_3.llm import generate_answer, generate_answer_async
+from milestone_3.answer_cache import answer_cache
+from milestone_3.executors import embed_executor, run_in
+from milestone_3.tracing import stage
+from milestone_3.reranker import RERANK_ENABLED, RERANK_KEEP, RERANK_TOP_N, rerank
+from milestone_3.prompt_builder import fit_context
+
+# Chunks passed to FLAN-T5 in retrieval order; a successful re-rank keeps
+# RERANK_KEEP instead, since its top chunks are more precise
+CONTEXT_CHUNKS = 3
 
-def build_prompt(user_query: str, chunks: list):
-    retrieved_chunks = "\n".join(
-        f"- {c['text']}" for c in chunks
-    )
 
-    prompt = f"""
+def render_prompt(user_query: str, retrieved_chunks: str) -> str:
+    return f"""
 You are an internal company Q&A assistant.
 
 Instructions:
@@ -25,9 +32,24 @@ Question:
 
 Answer:
 """
-    return prompt
 
 
+def build_prompt(user_query: str, chunks: list):
+    return assemble_prompt(user_query, chunks)[0]
+
+
+def assemble_prompt(user_query: str, chunks: list):
+    """
+    Fits the prompt into the generator's token budget: the instructions and
+    question are kept whole and the context is filled with the best-ranked
+    sentences of the chunks. Returns (prompt, chunks that were used).
+    """
+    prompt, used = fit_context(
+        user_query, chunks,
+        lambda context: render_prompt(user_query, context)
+    )
+    return prompt, [chunks[i] for i in used]
+
 
 def compute_confidence(chunks: list):
     if not chunks:
@@ -39,33 +61,176 @@ def compute_confidence(chunks: list):
     return round(confidence, 2)
 
 
-def rag_pipeline(query: str, user_role: str):
-    # RBAC-filtered retrieval
-    chunks = search_with_rbac(query, user_role)
+def retrieval_depth() -> int:
+    # Re-ranking wants a few more candidates
+    return max(5, RERANK_TOP_N) if RERANK_ENABLED else 5
+
 
+def retrieve_context(query: str, user_role: str, query_embedding: list = None):
+    """
+    Retrieval half of the pipeline. Returns None when nothing relevant is
+    accessible, otherwise the prompt plus the sources/confidence to report.
+    """
+    # RBAC-filtered retrieval
+    chunks = search_with_rbac(query, user_role, k=retrieval_depth(), query_embedding=query_embedding)
+    return build_context(query, chunks)
+
+
+def retrieve_contexts(queries: list, user_role: str, query_embeddings: list) -> list:
+    """
+    retrieve_context for many queries, sharing one Chroma query. Each item
+    is a context, None, or the exception that query raised.
+    """
+    try:
+        hits = search_with_rbac_batch(queries, user_role, k=retrieval_depth(), query_embeddings=query_embeddings)
+    except Exception as exc:
+        return [exc] * len(queries)
+
+    contexts = []
+    for query, chunks in zip(queries, hits):
+        try:
+            contexts.append(build_context(query, chunks))
+        except Exception as exc:
+            contexts.append(exc)
+    return contexts
+
+
+def build_context(query: str, chunks: list):
     # Hard relevance guard
     if not chunks or chunks[0]["distance"] > 2.0:
-        return {
-            "answer": "I don't know",
-            "sources": [],
-            "confidence": 0.0
-        }
+        return None
+
+    reranked = False
+    if RERANK_ENABLED:
+        chunks, reranked = rerank(query, chunks)
 
     # ✅ LIMIT CONTEXT SIZE (CRITICAL)
-    chunks = chunks[:3]
+    chunks = chunks[:RERANK_KEEP if reranked else CONTEXT_CHUNKS]
 
-    prompt = build_prompt(query, chunks)
-    answer = generate_answer(prompt)
+    with stage("prompt_build"):
+        prompt, used = assemble_prompt(query, chunks)
 
+    return {
+        "prompt": prompt,
+        # Only documents that made it into the prompt are cited
+        "sources": list(set(c["source"] for c in used or chunks)),
+        "confidence": compute_confidence(chunks)
+    }
+
+
+NO_ANSWER = {
+    "answer": "I don't know",
+    "sources": [],
+    "confidence": 0.0
+}
+
+
+def build_result(answer: str, context: dict):
     # ✅ GUARD AGAINST EMPTY OR GARBAGE OUTPUT
     if not answer or not answer.strip():
         answer = "I don't know"
 
-    confidence = compute_confidence(chunks)
-    sources = list(set(c["source"] for c in chunks))
-
     return {
         "answer": answer,
-        "sources": sources,
-        "confidence": confidence
+        "sources": context["sources"],
+        "confidence": context["confidence"]
     }
+
+
+def rag_pipeline(query: str, user_role: str):
+    query_embedding = embed_query(query)
+
+    # Cache hit skips retrieval and generation entirely; entries are
+    # scoped to the caller's role
+    with stage("cache_lookup"):
+        cached = answer_cache.get(user_role, query, query_embedding)
+    if cached is not None:
+        return cached
+
+    context = retrieve_context(query, user_role, query_embedding)
+
+    if context is None:
+        result = dict(NO_ANSWER)
+    else:
+        with stage("generate"):
+            answer = generate_answer(context["prompt"])
+        result = build_result(answer, context)
+
+    answer_cache.put(user_role, query, query_embedding, result)
+    return result
+
+
+async def rag_pipeline_async(query: str, user_role: str):
+    # Same stages as rag_pipeline; embedding and the Chroma query run on the
+    # embed pool and generation is awaited on the batcher, so the event
+    # loop is never blocked
+    query_embedding = await run_in(embed_executor, embed_query, query)
+
+    with stage("cache_lookup"):
+        cached = answer_cache.get(user_role, query, query_embedding)
+    if cached is not None:
+        return cached
+
+    context = await run_in(embed_executor, retrieve_context, query, user_role, query_embedding)
+
+    if context is None:
+        result = dict(NO_ANSWER)
+    else:
+        with stage("generate"):
+            answer = await generate_answer_async(context["prompt"])
+        result = build_result(answer, context)
+
+    answer_cache.put(user_role, query, query_embedding, result)
+    return result
+
+
+async def rag_pipeline_batch_async(queries: list, user_role: str) -> list:
+    """
+    rag_pipeline_async for many queries from one caller. Embedding is one
+    encode call, retrieval one Chroma query, and every prompt goes to the
+    batcher at once so they are generated in padded batches. Returns one
+    item per query, in order: a result dict, or the exception that query
+    raised, so one failure does not fail the rest.
+    """
+    try:
+        query_embeddings = await run_in(embed_executor, embed_queries, queries)
+    except Exception as exc:
+        return [exc] * len(queries)
+
+    results = [None] * len(queries)
+    pending = []
+    with stage("cache_lookup"):
+        for i, (query, query_embedding) in enumerate(zip(queries, query_embeddings)):
+            cached = answer_cache.get(user_role, query, query_embedding)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+    if not pending:
+        return results
+
+    contexts = await run_in(
+        embed_executor, retrieve_contexts,
+        [queries[i] for i in pending], user_role, [query_embeddings[i] for i in pending]
+    )
+
+    async def answer(i: int, context):
+        if isinstance(context, Exception):
+            return context
+        if context is None:
+            result = dict(NO_ANSWER)
+        else:
+            try:
+                result = build_result(await generate_answer_async(context["prompt"]), context)
+            except Exception as exc:
+                return exc
+        answer_cache.put(user_role, queries[i], query_embeddings[i], result)
+        return result
+
+    with stage("generate"):
+        answers = await asyncio.gather(*(answer(i, context) for i, context in zip(pending, contexts)))
+
+    for i, result in zip(pending, answers):
+        results[i] = result
+    return results
@@ -11,25 +11,32 @@ RBAC_RULES = {
     "c-level": ["finance", "hr", "engineering", "marketing", "general"]
 }
 
+# Set lookups for the per-request check
+RBAC_DEPARTMENTS = {role: frozenset(departments) for role, departments in RBAC_RULES.items()}
+
+
+def role_allows(role: str, department: str) -> bool:
+    return department.lower() in RBAC_DEPARTMENTS.get(role.lower(), ())
+
 def rbac_required(department: str = None):
     """
     If department is None → allow based on role only
     If department is set → enforce department access
     """
 
+    # The role comes straight from the verified (and cached) token claims,
+    # so this check never touches the database
     def checker(current_user: dict = Depends(get_current_user)):
         user_role = current_user["role"].lower()
 
-        if user_role not in RBAC_RULES:
+        if user_role not in RBAC_DEPARTMENTS:
             raise HTTPException(status_code=403, detail="Role not recognized")
 
         # If no department specified, just allow authenticated users
         if department is None:
             return current_user
 
-        allowed_departments = RBAC_RULES[user_role]
-
-        if department.lower() not in allowed_departments:
+        if not role_allows(user_role, department):
             raise HTTPException(
                 status_code=403,
                 detail=f"Access denied for role: {user_role}"
@@ -0,0 +1,84 @@
+import os
+import threading
+import traceback
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from sentence_transformers import CrossEncoder
+
+from milestone_3.executors import rerank_executor, submit_in
+from milestone_3.metrics import Counter
+from milestone_3.tracing import stage
+
+# Optional stage between retrieval and build_prompt: the top RERANK_TOP_N
+# chunks are scored against the query in one cross-encoder batch and the
+# best RERANK_KEEP go into the prompt. If scoring does not finish within
+# RERANK_BUDGET_MS, the retrieval order is used unchanged.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "8"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_KEEP = int(os.getenv("RERANK_KEEP", "2"))
+
+RERANK_RESULTS = Counter(
+    "rag_rerank_total",
+    "Re-ranking outcomes (reranked, timeout, error)",
+    labelnames=("result",)
+)
+
+model = None
+_load_lock = threading.Lock()
+
+
+def get_rerank_model():
+    global model
+    if model is None:
+        with _load_lock:
+            if model is None:
+                print("Loading cross-encoder...")
+                model = CrossEncoder(RERANK_MODEL)
+    return model
+
+
+def score_chunks(query: str, chunks: list) -> list:
+    # The first call also loads the model; it usually misses the budget,
+    # and later calls find the model ready
+    return get_rerank_model().predict([(query, c["text"]) for c in chunks]).tolist()
+
+
+def rerank(query: str, chunks: list, budget_ms: float = RERANK_BUDGET_MS):
+    """
+    Returns (chunks, reranked). On success the top RERANK_TOP_N are sorted
+    by cross-encoder score (best first, each with a rerank_score); on timeout
+    or error the input order is returned. budget_ms=None waits for scoring
+    however long it takes.
+    """
+    candidates = chunks[:RERANK_TOP_N]
+    if len(candidates) < 2:
+        return chunks, False
+
+    with stage("rerank"):
+        future = submit_in(rerank_executor, score_chunks, query, candidates)
+        try:
+            timeout = None if budget_ms is None else budget_ms / 1000
+            scores = future.result(timeout=timeout)
+        except FutureTimeout:
+            # Not started yet: drop it. Already running: it finishes in the
+            # background and the result is discarded.
+            future.cancel()
+            RERANK_RESULTS.inc(result="timeout")
+            return chunks, False
+        except Exception:
+            # Counted and logged with its traceback so a broken model shows
+            # up in rag_rerank_total{result="error"} rather than looking like
+            # plain retrieval order
+            RERANK_RESULTS.inc(result="error")
+            print("Re-ranking failed, keeping retrieval order:")
+            traceback.print_exc()
+            return chunks, False
+
+    RERANK_RESULTS.inc(result="reranked")
+    ranked = sorted(
+        ({**c, "rerank_score": score} for c, score in zip(candidates, scores)),
+        key=lambda c: -c["rerank_score"]
+    )
+    return ranked, True
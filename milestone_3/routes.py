@@ -1,12 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
-import sqlite3
-from milestone_3.database import DB_PATH
+from starlette.concurrency import run_in_threadpool
+from milestone_3 import database
+from milestone_3.document_catalog import document_catalog
 from milestone_3.models import verify_password, hash_password
 from milestone_3.auth import create_access_token, get_current_user
 from milestone_3.rbac import rbac_required
 from milestone_3.logs import log_access
 from milestone_3.rag import rag_pipeline
+from milestone_3.executors import hash_executor, run_in
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -14,26 +16,19 @@ router = APIRouter()
 
 # ================= LOGIN =================
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     username = form_data.username
     password = form_data.password
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT username, password, role FROM users WHERE username=?",
-        (username,)
-    )
-    user = cursor.fetchone()
-    conn.close()
+    user = await run_in_threadpool(database.find_user, username)
 
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     db_username, db_password, role = user
 
-    if not verify_password(password, db_password):
+    # bcrypt is deliberately slow; keep it on its own pool
+    if not await run_in(hash_executor, verify_password, password, db_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token({
@@ -49,13 +44,13 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 # ================= GET CURRENT USER =================
 @router.get("/me")
-def read_me(current_user: dict = Depends(get_current_user)):
+async def read_me(current_user: dict = Depends(get_current_user)):
     return current_user
 
 
 # ================= RBAC SECURE SEARCH =================
 @router.get("/secure-search")
-def secure_search(
+async def secure_search(
     department: str = Query(..., description="finance, hr, engineering, marketing, general"),
     current_user: dict = Depends(get_current_user)
 ):
@@ -66,7 +61,10 @@ def secure_search(
     rbac_required(department)(current_user)
 
     # LOG ACCESS
-    log_access(username, role, f"/secure-search?department={department}", confidence=1.0)
+    log_access(
+        username, role, f"/secure-search?department={department}", confidence=1.0,
+        endpoint="/secure-search"
+    )
 
     return {
         "requested_department": department,
@@ -78,25 +76,31 @@ def secure_search(
 # ================= ADMIN PANEL ROUTES =================
 
 # ---- VIEW ALL USERS ----
+def fetch_users_page(limit: int, offset: int):
+    return database.list_users(limit, offset), database.count_users()
+
+
 @router.get("/admin/users")
-def get_all_users(current_user: dict = Depends(get_current_user)):
+async def get_all_users(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"].lower() != "c-level":
         raise HTTPException(status_code=403, detail="Access denied")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT username, role FROM users")
-    users = cursor.fetchall()
+    users, total = await run_in_threadpool(fetch_users_page, limit, offset)
 
-    conn.close()
+    # The body stays a plain list; the total lets clients page through it
+    response.headers["X-Total-Count"] = str(total)
 
-    return [{"username": u[0], "role": u[1]} for u in users]
+    return [{"username": u["username"], "role": u["role"]} for u in users]
 
 
 # ---- ADD NEW USER ----
 @router.post("/admin/add-user")
-def add_user(
+async def add_user(
     username: str,
     password: str,
     role: str,
@@ -112,31 +116,18 @@ def add_user(
     if role not in allowed_roles:
         raise HTTPException(status_code=400, detail="Invalid role")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    hashed_password = await run_in(hash_executor, hash_password, password)
 
-    # Check duplicate user
-    cursor.execute("SELECT username FROM users WHERE username=?", (username,))
-    if cursor.fetchone():
-        conn.close()
+    # Duplicates are rejected by the UNIQUE username in the same statement
+    if not await run_in_threadpool(database.add_user, username, hashed_password, role):
         raise HTTPException(status_code=400, detail="User already exists")
 
-    hashed_password = hash_password(password)
-
-    cursor.execute(
-        "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-        (username, hashed_password, role)
-    )
-
-    conn.commit()
-    conn.close()
-
     return {"message": "User added successfully"}
 
 
 # ---- DELETE USER ----
 @router.delete("/admin/delete-user")
-def delete_user(
+async def delete_user(
     username: str,
     current_user: dict = Depends(get_current_user)
 ):
@@ -147,73 +138,46 @@ def delete_user(
     if username == current_user["username"]:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT role FROM users WHERE username=?", (username,))
-    user = cursor.fetchone()
-
-    if not user:
-        conn.close()
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Prevent deleting last C-Level
-    if user[0].lower() == "c-level":
-        cursor.execute("SELECT COUNT(*) FROM users WHERE role='c-level'")
-        count = cursor.fetchone()[0]
-        if count <= 1:
-            conn.close()
-            raise HTTPException(status_code=400, detail="Cannot delete last C-Level user")
-
-    cursor.execute("DELETE FROM users WHERE username=?", (username,))
-    conn.commit()
-    conn.close()
+    error = await run_in_threadpool(database.delete_user, username)
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
 
     return {"message": "User deleted successfully"}
 
 @router.get("/accessible-documents")
-def get_accessible_documents(current_user: dict = Depends(get_current_user)):
-
-    import os
-
-    base_path = os.path.join(os.getcwd(), "data", "raw")
+async def get_accessible_documents(
+    detailed: bool = Query(False, description="Include chunk counts and sizes per document"),
+    current_user: dict = Depends(get_current_user)
+):
+    # Precomputed per role by document_catalog; a dict lookup, no filesystem access
+    return document_catalog.accessible_documents(current_user["role"], detailed)
 
-    if not os.path.exists(base_path):
-        return {}
 
+# ================= SESSION BOOTSTRAP =================
+@router.get("/session")
+async def get_session(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Everything the UI needs on each rerun in one call: /me,
+    /accessible-documents and, for C-Level, the first page of /admin/users.
+    """
     role = current_user["role"].lower()
-
-    role_folder_map = {
-        "engineering": ["engineering", "general"],
-        "finance": ["finance", "general"],
-        "hr": ["hr", "general"],
-        "marketing": ["marketing", "general"],
-        "employees": ["general"],
-        "c-level": ["engineering", "finance", "hr", "marketing", "general"]
+    session = {
+        "user": current_user,
+        "accessible_documents": document_catalog.accessible_documents(role)
     }
 
-    requested_folders = role_folder_map.get(role, [])
-    result = {}
-
-    actual_folders = os.listdir(base_path)
-
-    for req_folder in requested_folders:
-        for actual in actual_folders:
-            if actual.lower() == req_folder.lower():
-                folder_path = os.path.join(base_path, actual)
-
-                if os.path.isdir(folder_path):
-                    clean_files = []
-
-                    for file in os.listdir(folder_path):
-                        if file.endswith(".md") or file.endswith(".csv"):
-                            clean_files.append(file)
-
-                    if clean_files:
-                        result[actual.capitalize()] = clean_files
-
-    return result
+    # Only C-Level sessions touch the database
+    if role == "c-level":
+        users, total = await run_in_threadpool(fetch_users_page, limit, 0)
+        session["admin"] = {
+            "users": [{"username": u["username"], "role": u["role"]} for u in users],
+            "total": total
+        }
 
+    return session
 
 
 # class ChatRequest(BaseModel):
@@ -1,47 +1,318 @@
+import os
+import threading
+import time
+
 import chromadb
-from sentence_transformers import SentenceTransformer
+import numpy as np
+
+from milestone_2.embedding_backend import (
+    COMPATIBILITY_MIN_COSINE, EMBEDDING_BACKEND, check_compatibility, load_embedder,
+    read_embedding_meta
+)
+from milestone_2.lexical_index import LEXICAL_INDEX_DIR, LexicalIndex, read_current_build
+from milestone_3.executors import lexical_executor, submit_in
+from milestone_3.model_client import get_model_client
+from milestone_3.tracing import stage
+from milestone_3.metrics import RBAC_DROPPED_CHUNKS
 
 VECTOR_DB_PATH = "data/chroma_db"
 COLLECTION_NAME = "chroma_db"
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
-model = SentenceTransformer(MODEL_NAME)
-client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
-collection = client.get_collection(COLLECTION_NAME)
+# hybrid: BM25 and vector search in parallel, fused with reciprocal rank
+# fusion; vector: Chroma only; lexical: BM25 only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RRF_K = 60
+LEXICAL_CHECK_SECONDS = 5.0
+
+# Loaded on first use, and never in a worker that talks to the model server
+model = None
+collection = None
+lexical_index = None
+_lexical_build = None
+_lexical_checked_at = float("-inf")
+_load_lock = threading.Lock()
+
+
+def load_compatible_embedder():
+    """
+    Loads EMBEDDING_BACKEND and checks it against the probe vectors the
+    embedder stored with the index. If they drifted too far apart, queries
+    fall back to the backend the index was built with.
+    """
+    embedder = load_embedder(MODEL_NAME)
+    meta = read_embedding_meta()
+    if meta is None:
+        print("No embedding metadata next to the index; skipping the compatibility check")
+        return embedder
+
+    similarity = check_compatibility(embedder, MODEL_NAME, meta)
+    print(f"Embedding backend {EMBEDDING_BACKEND}: cosine {similarity:.4f} vs {meta['backend']} index")
+    if similarity >= COMPATIBILITY_MIN_COSINE:
+        return embedder
+
+    print(f"Below {COMPATIBILITY_MIN_COSINE}; using the {meta['backend']} backend for queries")
+    return load_embedder(MODEL_NAME, meta["backend"])
+
+
+def get_embedding_model():
+    global model
+    if model is None:
+        with _load_lock:
+            if model is None:
+                model = load_compatible_embedder()
+    return model
+
+
+def get_collection():
+    global collection
+    if collection is None:
+        with _load_lock:
+            if collection is None:
+                client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+                collection = client.get_collection(COLLECTION_NAME)
+    return collection
+
+
+def role_flag_key(role: str) -> str:
+    # Must match milestone_2/embedder.role_flag_key, which writes these flags
+    return "role_" + role.strip().lower().replace("-", "_")
 
 
-def search_with_rbac(query: str, user_role: str, k: int = 5):
-    user_role_norm = user_role.lower()
-    query_embedding = model.encode(query).tolist()
+def build_role_filter(user_role: str):
+    # C-Level can read every department, so no filter is needed
+    if user_role.lower() == "c-level":
+        return None
+    return {role_flag_key(user_role): True}
 
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=10,
-        include=["documents", "metadatas", "distances"]
-    )
 
+def embed_texts(texts: list) -> list:
+    return [vector.tolist() for vector in get_embedding_model().encode(texts)]
+
+
+def embed_query(query: str) -> list:
+    with stage("embed"):
+        remote = get_model_client()
+        if remote is not None:
+            return remote.embed([query])[0]
+
+        return get_embedding_model().encode(query).tolist()
+
+
+def embed_queries(queries: list) -> list:
+    # One encode call (or one model server round-trip) for the whole list
+    with stage("embed"):
+        remote = get_model_client()
+        if remote is not None:
+            return remote.embed(queries)
+
+        return embed_texts(queries)
+
+
+def vector_search(query_embedding: list, user_role: str, n: int) -> list:
+    return vector_search_batch([query_embedding], user_role, n)[0]
+
+
+def vector_search_batch(query_embeddings: list, user_role: str, n: int) -> list:
+    # One Chroma query for every embedding; RBAC is enforced inside Chroma,
+    # so every hit returned is usable and n is honored exactly
+    with stage("chroma_query"):
+        results = get_collection().query(
+            query_embeddings=query_embeddings,
+            n_results=n,
+            where=build_role_filter(user_role),
+            include=["documents", "metadatas", "distances"]
+        )
+
+    with stage("rbac_filter"):
+        return [
+            rbac_filter(user_role, ids, documents, metadatas, distances)
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+
+def rbac_filter(user_role: str, ids, documents, metadatas, distances) -> list:
+    flag = role_flag_key(user_role)
     allowed = []
 
-    for doc, meta, dist in zip(
-        results["documents"][0],
-        results["metadatas"][0],
-        results["distances"][0]
-    ):
-        roles_allowed = [
-            r.strip().lower()
-            for r in meta["accessible_roles"].split(",")
+    for chunk_id, doc, meta, dist in zip(ids, documents, metadatas, distances):
+        # Defensive re-check; never trust a hit without the role flag
+        if user_role.lower() != "c-level" and not meta.get(flag):
+            RBAC_DROPPED_CHUNKS.inc()
+            continue
+
+        hit = {
+            "chunk_id": chunk_id,
+            "text": doc,
+            "source": meta["source_document"],
+            "department": meta["department"],
+            "distance": dist
+        }
+        # Chunks cut from CSV rows say which rows they hold
+        if "row_start" in meta:
+            hit["row_start"] = meta["row_start"]
+            hit["row_end"] = meta["row_end"]
+        allowed.append(hit)
+
+    return allowed
+
+
+def get_lexical_index():
+    # Reopened when the embedder publishes a new build
+    global lexical_index, _lexical_build, _lexical_checked_at
+    now = time.monotonic()
+    if now - _lexical_checked_at < LEXICAL_CHECK_SECONDS:
+        return lexical_index
+
+    with _load_lock:
+        _lexical_checked_at = now
+        build = read_current_build(LEXICAL_INDEX_DIR)
+        if build != _lexical_build:
+            try:
+                lexical_index = LexicalIndex.open(LEXICAL_INDEX_DIR)
+            except (OSError, ValueError, KeyError) as exc:
+                print(f"Could not open lexical index: {exc!r}")
+                lexical_index = None
+            _lexical_build = build
+    return lexical_index
+
+
+def lexical_search(index, query: str, user_role: str, n: int) -> list:
+    # RBAC is applied inside the index (role bitmask) before ranking
+    with stage("lexical_query"):
+        return index.search(query, user_role, n)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda chunk_id: -scores[chunk_id])
+
+
+def embedding_distance(space: str, a, b) -> float:
+    # Same definitions Chroma uses for each hnsw:space
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if space == "cosine":
+        return float(1.0 - a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+    if space == "ip":
+        return float(1.0 - a @ b)
+    return float(((a - b) ** 2).sum())
+
+
+def fetch_chunks(chunk_ids: list, user_role: str, query_embedding: list) -> list:
+    """
+    Loads chunks found only by the lexical index, with the distance Chroma
+    would have reported, so confidence and the relevance guard still work.
+    """
+    return fetch_chunks_batch([chunk_ids], user_role, [query_embedding])[0]
+
+
+def fetch_chunks_batch(chunk_ids_per_query: list, user_role: str, query_embeddings: list) -> list:
+    # One Chroma get for the union of ids; distances are per query
+    wanted = list(dict.fromkeys(chunk_id for ids in chunk_ids_per_query for chunk_id in ids))
+    if not wanted:
+        return [[] for _ in chunk_ids_per_query]
+
+    collection = get_collection()
+    with stage("chroma_fetch"):
+        results = collection.get(
+            ids=wanted,
+            include=["documents", "metadatas", "embeddings"]
+        )
+
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    rows = {chunk_id: row for row, chunk_id in enumerate(results["ids"])}
+
+    hits = []
+    for chunk_ids, query_embedding in zip(chunk_ids_per_query, query_embeddings):
+        found = [rows[chunk_id] for chunk_id in chunk_ids if chunk_id in rows]
+        distances = [
+            embedding_distance(space, query_embedding, results["embeddings"][row])
+            for row in found
         ]
+        with stage("rbac_filter"):
+            hits.append(rbac_filter(
+                user_role,
+                [results["ids"][row] for row in found],
+                [results["documents"][row] for row in found],
+                [results["metadatas"][row] for row in found],
+                distances
+            ))
+    return hits
 
-        if user_role_norm == "c-level" or user_role_norm in roles_allowed:
-            allowed.append({
-                "text": doc,
-                "source": meta["source_document"],
-                "department": meta["department"],
-                "distance": dist
-            })
 
-    return allowed[:k]
+def search_with_rbac(
+    query: str,
+    user_role: str,
+    k: int = 5,
+    query_embedding: list = None,
+    mode: str = None
+):
+    """
+    mode: "hybrid" (BM25 + vector, fused with RRF), "vector" or "lexical";
+    defaults to RETRIEVAL_MODE. Without a lexical index it is always "vector".
+    """
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    return search_with_rbac_batch([query], user_role, k, [query_embedding], mode)[0]
 
 
+def search_with_rbac_batch(
+    queries: list,
+    user_role: str,
+    k: int = 5,
+    query_embeddings: list = None,
+    mode: str = None
+) -> list:
+    """
+    search_with_rbac for many queries from the same caller: one embed call,
+    one Chroma query and at most one Chroma get. Returns a hit list per
+    query, in order.
+    """
+    if query_embeddings is None:
+        query_embeddings = embed_queries(queries)
+
+    mode = mode or RETRIEVAL_MODE
+    index = get_lexical_index() if mode != "vector" else None
+    if index is None:
+        return [hits[:k] for hits in vector_search_batch(query_embeddings, user_role, k)]
+
+    n = max(k, RETRIEVAL_CANDIDATES)
+
+    # The BM25 lookups run while this thread waits on Chroma
+    lexical = [submit_in(lexical_executor, lexical_search, index, query, user_role, n) for query in queries]
+    if mode == "hybrid":
+        vector_hits = vector_search_batch(query_embeddings, user_role, n)
+    else:
+        vector_hits = [[] for _ in queries]
+    lexical_hits = [future.result() for future in lexical]
+
+    with stage("fusion"):
+        fused = [
+            reciprocal_rank_fusion([
+                [hit["chunk_id"] for hit in vector],
+                [chunk_id for chunk_id, _ in lexical]
+            ])[:k]
+            for vector, lexical in zip(vector_hits, lexical_hits)
+        ]
+
+    by_id = [{hit["chunk_id"]: hit for hit in vector} for vector in vector_hits]
+    missing = [
+        [chunk_id for chunk_id in ids if chunk_id not in hits]
+        for ids, hits in zip(fused, by_id)
+    ]
+    if any(missing):
+        for hits, fetched in zip(by_id, fetch_chunks_batch(missing, user_role, query_embeddings)):
+            for hit in fetched:
+                hits[hit["chunk_id"]] = hit
 
-# what is the financial summary?
\ No newline at end of file
+    return [
+        [hits[chunk_id] for chunk_id in ids if chunk_id in hits]
+        for ids, hits in zip(fused, by_id)
+    ]
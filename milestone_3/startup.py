@@ -0,0 +1,218 @@
+"""
+Cold-start handling: model prefetch at image build time, background model
+loading and warmup at process start, and the readiness state behind /ready.
+
+    # Dockerfile: download (and for onnx backends, export) every model once
+    python -m milestone_3.startup --prefetch
+
+At startup the API answers /health immediately, while /ready returns 503
+until the embedding model, FLAN-T5, the vector store and the lexical index
+are loaded and one embed and one generate have run. Each phase's duration
+is printed, returned by /ready and exported as startup_phase_seconds.
+"""
+import argparse
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from milestone_3.metrics import CallbackMetric
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1").lower() in ("1", "true", "yes")
+
+WARMUP_QUERY = "How many days of annual leave do employees get?"
+WARMUP_PROMPT = (
+    "Answer the question using only the context below.\n\n"
+    "Context:\n- Employees are entitled to 20 days of annual leave.\n\n"
+    f"Question: {WARMUP_QUERY}\nAnswer:"
+)
+
+# Measured from import, which is as close to process start as the app gets
+_process_start = time.perf_counter()
+
+
+class StartupState:
+    def __init__(self):
+        self.phases = {}      # name -> seconds, in the order they ran
+        self.current = None
+        self.error = None
+        self.ready = False
+        self.total_seconds = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        # If the body raises, current keeps naming the phase that failed
+        self.current = name
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.phases[name] = seconds
+            self.current = None
+        print(f"Startup phase {name}: {seconds:.2f} s")
+
+    def mark_ready(self):
+        self.total_seconds = time.perf_counter() - _process_start
+        self.ready = True
+        print(f"Ready after {self.total_seconds:.2f} s")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            phases = dict(self.phases)
+        if self.ready:
+            status = "ready"
+        elif self.error is not None:
+            status = "failed"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "phase": self.current,
+            "error": self.error,
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in phases.items()},
+            "total_ms": round(self.total_seconds * 1000, 1) if self.total_seconds is not None else None
+        }
+
+
+startup_state = StartupState()
+
+CallbackMetric(
+    "startup_phase_seconds",
+    "Duration of each startup phase in this process",
+    "gauge",
+    lambda: {(name,): seconds for name, seconds in startup_state.phases.items()},
+    labelnames=("phase",)
+)
+
+CallbackMetric(
+    "startup_ready",
+    "1 once models are loaded and warmed up",
+    "gauge",
+    lambda: {(): 1 if startup_state.ready else 0}
+)
+
+
+def load_models(state: StartupState, remote, local: bool = False):
+    from milestone_3 import llm, prompt_builder, reranker
+    from milestone_3.search_service import get_collection, get_embedding_model, get_lexical_index
+
+    if remote is not None:
+        # Models live in the model server; only check it is up
+        with state.phase("model_server"):
+            remote.call("ping", None)
+    else:
+        with state.phase("embedding_model"):
+            get_embedding_model()
+        with state.phase("generation_model"):
+            llm.load_model()
+
+    if local:
+        # The model server only serves embedding and generation; the index,
+        # re-ranker and prompt tokenizer belong to the API process
+        return
+
+    with state.phase("prompt_tokenizer"):
+        prompt_builder.get_tokenizer()
+    if reranker.RERANK_ENABLED:
+        with state.phase("rerank_model"):
+            reranker.get_rerank_model()
+    with state.phase("vector_store"):
+        get_collection()
+    with state.phase("lexical_index"):
+        get_lexical_index()
+
+
+def warm_up(state: StartupState, remote, local: bool = False):
+    # First calls pay for allocator growth, kernel selection and lazy
+    # initialisation inside torch/tokenizers; they are made here instead
+    # of in the first user's request
+    from milestone_3 import llm, reranker
+    from milestone_3.search_service import get_embedding_model
+
+    with state.phase("warmup_embed"):
+        if remote is not None:
+            remote.embed([WARMUP_QUERY])
+        else:
+            get_embedding_model().encode([WARMUP_QUERY])
+
+    with state.phase("warmup_generate"):
+        if remote is not None:
+            remote.generate(WARMUP_PROMPT)
+        else:
+            llm.batcher.submit(WARMUP_PROMPT).result()
+
+    if reranker.RERANK_ENABLED and not local:
+        with state.phase("warmup_rerank"):
+            reranker.score_chunks(WARMUP_QUERY, [{"text": WARMUP_PROMPT}])
+
+
+def run_startup(state: StartupState = startup_state, warmup: bool = STARTUP_WARMUP, local: bool = False):
+    # local=True is for the model server itself: load the embedding and
+    # generation models here even though MODEL_SERVER_SOCKET is set, and
+    # nothing else, so it can start before the index is built
+    from milestone_3.model_client import get_model_client
+
+    try:
+        # Raises when MODEL_SERVER_SOCKET is set without MODEL_SERVER_AUTHKEY
+        remote = None if local else get_model_client()
+        load_models(state, remote, local=local)
+        if warmup:
+            warm_up(state, remote, local=local)
+    except Exception as exc:
+        # /ready keeps answering 503 with the error; requests still load
+        # whatever they need lazily
+        state.error = f"{state.current or 'startup'}: {exc!r}"
+        state.current = None
+        print(f"Startup failed in {state.error}")
+        return
+    state.mark_ready()
+
+
+def start_background_startup(state: StartupState = startup_state):
+    thread = threading.Thread(target=run_startup, args=(state,), name="startup", daemon=True)
+    thread.start()
+    return thread
+
+
+def prefetch_models():
+    """Downloads everything the app loads into the Hugging Face cache."""
+    from sentence_transformers import CrossEncoder
+
+    from milestone_2.embedding_backend import load_embedder
+    from milestone_3.generation_backends import load_generator
+    from milestone_3.llm import MODEL_NAME as GENERATION_MODEL
+    from milestone_3.reranker import RERANK_MODEL
+    from milestone_3.search_service import MODEL_NAME as EMBEDDING_MODEL
+
+    state = StartupState()
+    with state.phase("prefetch_embedding_model"):
+        load_embedder(EMBEDDING_MODEL)
+    with state.phase("prefetch_generation_model"):
+        load_generator(GENERATION_MODEL)
+    with state.phase("prefetch_rerank_model"):
+        CrossEncoder(RERANK_MODEL)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model prefetch and startup timing")
+    parser.add_argument(
+        "--prefetch", action="store_true",
+        help="Download models into the Hugging Face cache (run at image build time)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.prefetch:
+        prefetch_models()
+        return
+
+    # Without --prefetch: one in-process cold start, for tracking regressions
+    run_startup()
+    print(startup_state.snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import pytest
+
+from milestone_3 import prompt_builder
+from milestone_3.prompt_builder import PromptTooLong, fit_context
+from milestone_3.rag import render_prompt
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word keeps the budgets readable without loading FLAN-T5
+    monkeypatch.setattr(prompt_builder, "count_tokens", lambda text: len(text.split()))
+    prompt_builder.chunk_sentences.cache_clear()
+    yield
+    prompt_builder.chunk_sentences.cache_clear()
+
+
+def fit(query: str, chunks: list, budget: int):
+    return fit_context(query, chunks, lambda context: render_prompt(query, context), budget)
+
+
+def test_context_is_trimmed_but_question_kept():
+    query = "What is the leave policy?"
+    chunks = [{"text": " ".join(f"Leave rule {i} applies." for i in range(50))}]
+    fixed = len(render_prompt(query, "").split()) + 1
+
+    prompt, used = fit(query, chunks, budget=fixed + 20)
+
+    assert query in prompt
+    assert used == [0]
+    assert len(prompt.split()) + 1 <= fixed + 20
+
+
+def test_oversized_question_is_refused():
+    query = " ".join(["leave"] * 600)
+
+    with pytest.raises(PromptTooLong, match="Question is too long"):
+        fit(query, [{"text": "Leave is 20 days a year."}], budget=512)
@@ -0,0 +1,78 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from milestone_3.metrics import STAGE_SECONDS
+
+# Per-request stage timings. A request opts in with collect_stages(); code
+# on the hot path wraps its work in stage("name"). The dict travels with
+# the request's context, including hops through executors.run_in.
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+# Per-request counters (prompt/generated tokens) for the access log; same
+# opt-in pattern as the stage timings
+_current_counts = contextvars.ContextVar("rag_counts", default=None)
+
+
+@contextmanager
+def collect_stages():
+    trace = {}
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def collect_counts():
+    counts = {}
+    token = _current_counts.set(counts)
+    try:
+        yield counts
+    finally:
+        _current_counts.reset(token)
+
+
+def record_count(name: str, value: int):
+    counts = _current_counts.get()
+    if counts is not None:
+        counts[name] = counts.get(name, 0) + value
+
+
+def record_stage(name: str, seconds: float):
+    # Every stage feeds the /metrics histogram; the per-request dict is optional
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace[name] = trace.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def server_timing_header(trace: dict) -> str:
+    # https://www.w3.org/TR/server-timing/ ; durations in milliseconds
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.2f}" for name, seconds in trace.items()
+    )
+
+
+def parse_server_timing(header: str) -> dict:
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                stages[name] = float(value) / 1000
+    return stages
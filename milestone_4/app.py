@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 
@@ -19,12 +21,52 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
 
+def backend_readiness():
+    """The backend's /ready body, or None if it cannot be reached."""
+    try:
+        return requests.get(f"{API_URL}/ready", timeout=5).json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def show_warmup_notice(readiness) -> bool:
+    """Shows why the backend is not ready yet; True while it is still warming up."""
+    if readiness is None or readiness.get("status") == "ready":
+        return False
+    if readiness.get("status") == "failed":
+        st.warning(f"⚠️ Backend started with errors: {readiness.get('error')}")
+        return False
+    phase = readiness.get("phase") or "starting"
+    st.info(f"⏳ Backend is warming up models ({phase}). Chat will be available shortly.")
+    return True
+
+
+def read_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data_lines = "message", []
+
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
 # ================= LOGIN UI =================
 if st.session_state.token is None:
 
     st.title("🔐 Company Internal Chatbot")
     st.subheader("Login")
 
+    # Login does not need the models, so it stays available while they load
+    show_warmup_notice(backend_readiness())
+
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
 
@@ -62,10 +104,10 @@ else:
         "Authorization": f"Bearer {st.session_state.token}"
     }
 
-    # -------- Fetch User Info --------
+    # -------- Fetch Session (user, documents, admin users) --------
     try:
         response = requests.get(
-            f"{API_URL}/me",
+            f"{API_URL}/session",
             headers=headers,
             timeout=30
         )
@@ -78,7 +120,8 @@ else:
         st.session_state.token = None
         st.stop()
 
-    user = response.json()
+    session = response.json()
+    user = session["user"]
 
     # ================= Sidebar =================
     st.sidebar.title("👤 User Info")
@@ -89,29 +132,15 @@ else:
     st.sidebar.markdown("---")
     st.sidebar.subheader("📁 Accessible Documents")
 
-    try:
-        doc_response = requests.get(
-            f"{API_URL}/accessible-documents",
-            headers=headers,
-            timeout=30
-        )
-
-        if doc_response.status_code == 200:
-            accessible_files = doc_response.json()
+    accessible_files = session["accessible_documents"]
 
-            if accessible_files:
-                for department, files in accessible_files.items():
-                    with st.sidebar.expander(f"📂 {department}", expanded=False):
-                        for file in files:
-                            st.markdown(f"📄 {file}")
-            else:
-                st.sidebar.write("No accessible files.")
-
-        else:
-            st.sidebar.error("Could not fetch documents.")
-
-    except:
-        st.sidebar.error("Backend not responding.")
+    if accessible_files:
+        for department, files in accessible_files.items():
+            with st.sidebar.expander(f"📂 {department}", expanded=False):
+                for file in files:
+                    st.markdown(f"📄 {file}")
+    else:
+        st.sidebar.write("No accessible files.")
 
     # ================= Admin Panel =================
     if user["role"].lower() == "c-level":
@@ -125,11 +154,12 @@ else:
         )
 
         if admin_tab == "View Users":
-            response = requests.get(f"{API_URL}/admin/users", headers=headers)
-            if response.status_code == 200:
-                users = response.json()
-                for u in users:
+            admin = session.get("admin")
+            if admin is not None:
+                for u in admin["users"]:
                     st.sidebar.write(f"👤 {u['username']} ({u['role']})")
+                if admin["total"] > len(admin["users"]):
+                    st.sidebar.caption(f"Showing {len(admin['users'])} of {admin['total']} users")
             else:
                 st.sidebar.error("Access denied.")
 
@@ -204,11 +234,15 @@ else:
         with st.chat_message("user"):
             st.write(query)
 
+        if show_warmup_notice(backend_readiness()):
+            st.stop()
+
         try:
             chat_response = requests.post(
-                f"{API_URL}/chat",
+                f"{API_URL}/chat/stream",
                 json={"query": query},
                 headers=headers,
+                stream=True,
                 timeout=40
             )
         except:
@@ -217,21 +251,37 @@ else:
 
         if chat_response.status_code == 200:
 
-            data = chat_response.json()
+            meta = {"sources": [], "confidence": 0.0}
+            answer = ""
 
             with st.chat_message("assistant"):
-                st.write(data.get("answer", "No answer generated."))
-                st.markdown(f"**Confidence:** {data.get('confidence', 0.0)}")
-                if data.get("sources"):
+                answer_box = st.empty()
+
+                # Render the answer as SSE token events arrive
+                for event, data in read_sse(chat_response):
+                    if event == "sources":
+                        meta = data
+                    elif event == "token":
+                        answer += data["text"]
+                        answer_box.write(answer + " ▌")
+                    elif event == "done":
+                        answer = data["answer"]
+                    elif event == "error":
+                        st.error(data["detail"])
+
+                answer = answer or "No answer generated."
+                answer_box.write(answer)
+                st.markdown(f"**Confidence:** {meta.get('confidence', 0.0)}")
+                if meta.get("sources"):
                     st.markdown("**Sources:**")
-                    for src in data["sources"]:
+                    for src in meta["sources"]:
                         st.write(f"- {src}")
 
             st.session_state.chat_history.append({
                 "query": query,
-                "answer": data.get("answer"),
-                "confidence": data.get("confidence"),
-                "sources": data.get("sources", [])
+                "answer": answer,
+                "confidence": meta.get("confidence"),
+                "sources": meta.get("sources", [])
             })
 
         elif chat_response.status_code == 403:
@@ -246,7 +296,6 @@ else:
 
 
 
-
 # uvicorn milestone_3.main:app --workers 2
 # streamlit run milestone_4/app.py
 